@@ -0,0 +1,40 @@
+import asyncio
+import os
+import httpx
+import pytest
+from main import app
+
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", 100))
+
+# Issue CONCURRENCY identical requests at once through the ASGI app, as many dashboard tabs would
+def run_concurrent(path):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            responses = await asyncio.gather(*(client.get(path) for _ in range(CONCURRENCY)))
+        assert all(response.status_code == 200 for response in responses)
+
+    asyncio.run(main())
+
+@pytest.mark.parametrize("path", [
+    "/crypto/",
+    "/crypto/analysis/market-dominance",
+    "/crypto/analysis/volatility",
+    "/crypto/analysis/correlation-matrix",
+    "/crypto/analysis/volume",
+])
+def bench_route_under_concurrent_load(benchmark, seeded_ids, path):
+    benchmark.extra_info["concurrency"] = CONCURRENCY
+    benchmark.pedantic(run_concurrent, args=(path,), rounds=5, iterations=1)
+
+def bench_history_route(benchmark, seeded_ids):
+    crypto_id = next(iter(seeded_ids.values()))
+    benchmark.pedantic(run_concurrent, args=(f"/crypto/{crypto_id}/history",), rounds=5, iterations=1)
+
+def bench_candles_route(benchmark, seeded_ids):
+    crypto_id = next(iter(seeded_ids.values()))
+    benchmark.pedantic(run_concurrent, args=(f"/crypto/{crypto_id}/candles?interval=1w",), rounds=5, iterations=1)
+
+def bench_comparison_route(benchmark, seeded_ids):
+    query = "&".join(f"ids={crypto_id}" for crypto_id in seeded_ids.values())
+    benchmark.pedantic(run_concurrent, args=(f"/crypto/analysis/comparison?{query}&period=30",), rounds=5, iterations=1)
@@ -0,0 +1,16 @@
+import pytest
+from benchmarks.synthetic import coin_ids
+from etl.coingecko_etl import run_etl
+
+@pytest.mark.parametrize("n_coins", [50, 500])
+def bench_run_etl(benchmark, fake_coingecko, n_coins):
+    """One full ETL cycle against the fake CoinGecko server (extract, transform, load and snapshots)."""
+    crypto_ids = coin_ids(n_coins)
+    benchmark.extra_info["upstream_latency"] = fake_coingecko.latency
+    benchmark.pedantic(run_etl, args=(crypto_ids,), rounds=3, iterations=1)
+
+def bench_run_etl_sequential(benchmark, fake_coingecko):
+    """Baseline: the same 50-coin cycle with a single worker and no batched market snapshot."""
+    benchmark.pedantic(
+        run_etl, args=(coin_ids(50),), kwargs={"max_workers": 1, "use_markets_snapshot": False}, rounds=3, iterations=1
+    )
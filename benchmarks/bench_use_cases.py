@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from use_cases.indicators import parse_indicators
+from use_cases.crypto_use_cases import (
+    GetAllCryptocurrenciesUseCase,
+    GetHistoricalPricesByCryptoIdUseCase,
+    CalculateCryptoROIUseCase,
+    GetHighestVolumeCryptoUseCase,
+    CalculateCorrelationUseCase,
+    CalculateCorrelationMatrixUseCase,
+    CalculateVolatilityUseCase,
+    CalculateIndicatorsUseCase,
+    CalculateMarketDominanceUseCase,
+    AnalyzePriceTrendUseCase,
+    ComparePerformanceUseCase,
+)
+
+def bench_get_all_cryptocurrencies(benchmark, seeded_ids):
+    benchmark(GetAllCryptocurrenciesUseCase.execute)
+
+def bench_historical_prices(benchmark, seeded_ids):
+    crypto_id = next(iter(seeded_ids.values()))
+    benchmark(GetHistoricalPricesByCryptoIdUseCase.execute, crypto_id)
+
+def bench_roi(benchmark, seeded_ids):
+    crypto_id = next(iter(seeded_ids.values()))
+    end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    benchmark(CalculateCryptoROIUseCase.execute, crypto_id, end_date - timedelta(days=90), end_date)
+
+def bench_highest_volume(benchmark, seeded_ids):
+    benchmark(GetHighestVolumeCryptoUseCase.execute)
+
+def bench_correlation(benchmark, seeded_ids):
+    crypto_id_1, crypto_id_2 = list(seeded_ids.values())[:2]
+    benchmark(CalculateCorrelationUseCase.execute, crypto_id_1, crypto_id_2, 90)
+
+def bench_correlation_matrix(benchmark, seeded_ids):
+    benchmark(CalculateCorrelationMatrixUseCase.execute, 90)
+
+def bench_volatility(benchmark, seeded_ids):
+    benchmark(CalculateVolatilityUseCase.execute)
+
+def bench_indicators(benchmark, seeded_ids):
+    specs = parse_indicators(["sma:20", "ema:20", "rsi:14", "volatility:30", "max_drawdown", "sharpe"])
+    benchmark(CalculateIndicatorsUseCase.execute, specs, days=180)
+
+def bench_market_dominance(benchmark, seeded_ids):
+    benchmark(CalculateMarketDominanceUseCase.execute)
+
+def bench_trend(benchmark, seeded_ids):
+    crypto_id = next(iter(seeded_ids.values()))
+    benchmark(AnalyzePriceTrendUseCase.execute, crypto_id, 30)
+
+def bench_comparison(benchmark, seeded_ids):
+    benchmark(ComparePerformanceUseCase.execute, list(seeded_ids.values()), 30)
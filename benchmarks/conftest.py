@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+# Make the project modules importable when pytest runs from the benchmarks directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_coingecko import FakeCoinGeckoServer
+
+# Configuration is read at import time, so point it at local resources before importing any project module
+WORKDIR = tempfile.mkdtemp(prefix="crypto-bench-")
+FAKE_COINGECKO = FakeCoinGeckoServer(
+    latency=float(os.getenv("BENCH_UPSTREAM_LATENCY", 0.02)),
+    rate_limit_probability=float(os.getenv("BENCH_RATE_LIMIT_PROBABILITY", 0.0)),
+).start()
+os.environ.update({
+    "STORAGE_BACKEND": "sqlite",
+    "SQLITE_PATH": os.path.join(WORKDIR, "bench.db"),
+    "COINGECKO_API_URL": FAKE_COINGECKO.url,
+    "COINGECKO_RATE_LIMIT": "1000000",
+    "COINGECKO_RATE_BURST": "1000",
+    "HTTP_CACHE_DIR": "",
+    "ETL_GENERATION_FILE": os.path.join(WORKDIR, "generation"),
+    "ANALYTICS_SNAPSHOT_DIR": os.path.join(WORKDIR, "snapshots"),
+    "PRICE_SNAPSHOT_DIR": os.path.join(WORKDIR, "price_snapshots"),
+})
+
+import pytest
+from benchmarks.synthetic import seed_repository
+
+BENCH_COINS = int(os.getenv("BENCH_COINS", 50))
+BENCH_DAYS = int(os.getenv("BENCH_DAYS", 365))
+
+@pytest.fixture(scope="session")
+def fake_coingecko():
+    yield FAKE_COINGECKO
+
+@pytest.fixture(scope="session")
+def seeded_ids():
+    """Seeds the SQLite database with BENCH_COINS x BENCH_DAYS of synthetic history."""
+    from repositories.factory import get_repository
+
+    return seed_repository(get_repository(), BENCH_COINS, BENCH_DAYS)
+
+def pytest_sessionfinish(session, exitstatus):
+    FAKE_COINGECKO.stop()
@@ -0,0 +1,146 @@
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from benchmarks.synthetic import price_series, day_starts
+
+class FakeCoinGeckoServer:
+    """Local stand-in for the CoinGecko endpoints used by the ETL, with configurable latency and 429 injection."""
+
+    def __init__(self, latency: float = 0.0, rate_limit_probability: float = 0.0, retry_after: int = 1, seed: int = 0):
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.seed = seed
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/api/v3"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Response bodies
+
+    def coin(self, coingecko_id):
+        close, volume, market_cap = price_series(coingecko_id, 1, self.seed)
+        return {
+            "id": coingecko_id,
+            "symbol": coingecko_id.replace("coin-", "c"),
+            "name": coingecko_id.replace("-", " ").title(),
+            "market_data": {
+                "current_price": {"usd": float(close[-1])},
+                "market_cap": {"usd": float(market_cap[-1])},
+                "total_volume": {"usd": float(volume[-1])},
+            },
+        }
+
+    def market_row(self, coingecko_id):
+        coin = self.coin(coingecko_id)
+        return {
+            "id": coingecko_id,
+            "symbol": coin["symbol"],
+            "name": coin["name"],
+            "current_price": coin["market_data"]["current_price"]["usd"],
+            "market_cap": coin["market_data"]["market_cap"]["usd"],
+            "total_volume": coin["market_data"]["total_volume"]["usd"],
+        }
+
+    def market_chart(self, coingecko_id, n_days, end=None):
+        # Daily points at 00:00 UTC plus the current moment, like CoinGecko's daily interval
+        days = day_starts(n_days, end)
+        timestamps = [int(day.timestamp() * 1000) for day in days]
+        if end is None:
+            timestamps.append(int(datetime.now(timezone.utc).timestamp() * 1000))
+        close, volume, market_cap = price_series(coingecko_id, len(timestamps), self.seed)
+        return {
+            "prices": [[t, float(v)] for t, v in zip(timestamps, close)],
+            "market_caps": [[t, float(v)] for t, v in zip(timestamps, market_cap)],
+            "total_volumes": [[t, float(v)] for t, v in zip(timestamps, volume)],
+        }
+
+    def route(self, path, query):
+        if path.endswith("/coins/markets"):
+            ids = query.get("ids", [""])[0].split(",") if "ids" in query else []
+            per_page = int(query.get("per_page", ["100"])[0])
+            page = int(query.get("page", ["1"])[0])
+            if not ids:
+                ids = [f"coin-{index:05d}" for index in range((page - 1) * per_page, page * per_page)]
+            return [self.market_row(coingecko_id) for coingecko_id in ids if coingecko_id]
+
+        match = re.search(r"/coins/([^/]+)/market_chart/range$", path)
+        if match:
+            start = float(query["from"][0])
+            end = float(query["to"][0])
+            n_days = max(1, int((end - start) // 86400))
+            return self.market_chart(match.group(1), n_days, datetime.fromtimestamp(end, tz=timezone.utc))
+
+        match = re.search(r"/coins/([^/]+)/market_chart$", path)
+        if match:
+            return self.market_chart(match.group(1), int(float(query.get("days", ["1"])[0])))
+
+        match = re.search(r"/coins/([^/]+)$", path)
+        if match:
+            return self.coin(match.group(1))
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.request_count += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                # Inject rate limiting the way CoinGecko reports it
+                if random.random() < server.rate_limit_probability:
+                    with server.lock:
+                        server.rate_limited_count += 1
+                    self.send_response(429)
+                    self.send_header("Retry-After", str(server.retry_after))
+                    self.end_headers()
+                    return
+
+                parsed = urlparse(self.path)
+                body = server.route(parsed.path, parse_qs(parsed.query))
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass  # Keep benchmark output clean
+
+        return Handler
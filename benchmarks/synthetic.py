@@ -0,0 +1,72 @@
+import zlib
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+# Deterministic per-coin seed so every run (and the fake CoinGecko server) produces the same series
+def coin_seed(coingecko_id: str, seed: int = 0) -> int:
+    return zlib.crc32(coingecko_id.encode()) ^ seed
+
+def coin_ids(n_coins: int):
+    """Returns N synthetic CoinGecko ids."""
+    return [f"coin-{index:05d}" for index in range(n_coins)]
+
+def price_series(coingecko_id: str, n_days: int, seed: int = 0):
+    """Generates close price, volume and market cap arrays following a geometric random walk."""
+    rng = np.random.default_rng(coin_seed(coingecko_id, seed))
+    start_price = rng.uniform(0.5, 50_000)
+    log_returns = rng.normal(0.0, rng.uniform(0.01, 0.08), size=n_days)
+    close = start_price * np.exp(np.cumsum(log_returns))
+    supply = rng.uniform(1e6, 1e9)
+    volume = close * supply * rng.uniform(0.01, 0.2, size=n_days)
+    return close, volume, close * supply
+
+def day_starts(n_days: int, end: datetime = None):
+    """Returns the UTC day starts of the last N days, oldest first, ending today."""
+    end = (end or datetime.now(timezone.utc)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return [end - timedelta(days=n_days - 1 - offset) for offset in range(n_days)]
+
+def generate_cryptocurrencies(n_coins: int, seed: int = 0):
+    """Returns rows shaped like the 'cryptocurrencies' table (without database IDs)."""
+    rows = []
+    for coingecko_id in coin_ids(n_coins):
+        close, volume, market_cap = price_series(coingecko_id, 1, seed)
+        rows.append({
+            "coingecko_id": coingecko_id,
+            "symbol": coingecko_id.replace("coin-", "C").upper(),
+            "name": coingecko_id.replace("-", " ").title(),
+            "current_price": float(close[-1]),
+            "market_cap": float(market_cap[-1]),
+            "total_volume": float(volume[-1]),
+            "last_updated": datetime.now(),
+        })
+    return rows
+
+def generate_history(crypto_ids: dict, n_days: int, seed: int = 0):
+    """Returns rows shaped like the 'historical_prices' table for every {coingecko_id: crypto_id}."""
+    days = [day.replace(tzinfo=None).isoformat() for day in day_starts(n_days)]
+    rows = []
+    for coingecko_id, crypto_id in crypto_ids.items():
+        close, volume, market_cap = price_series(coingecko_id, n_days, seed)
+        rows.extend(
+            {
+                "crypto_id": crypto_id,
+                "coingecko_id": coingecko_id,
+                "date": date,
+                "close_price": float(c),
+                "total_volume": float(v),
+                "market_cap": float(m),
+            }
+            for date, c, v, m in zip(days, close, volume, market_cap)
+        )
+    return rows
+
+def seed_repository(repo, n_coins: int, n_days: int, seed: int = 0, chunk_size: int = 5000):
+    """Loads N coins x M days of synthetic data into a repository and returns the {coingecko_id: id} mapping."""
+    from models.cryptocurrency import Cryptocurrency
+
+    cryptos = [Cryptocurrency(**row) for row in generate_cryptocurrencies(n_coins, seed)]
+    crypto_ids = {row["coingecko_id"]: row["id"] for row in repo.upsert_cryptocurrencies(cryptos)}
+    history = generate_history(crypto_ids, n_days, seed)
+    for start in range(0, len(history), chunk_size):
+        repo.upsert_historical_prices(history[start:start + chunk_size])
+    return crypto_ids
@@ -4,6 +4,10 @@ from dotenv import load_dotenv
 # Load environment variables from a .env file
 load_dotenv()
 
+# Storage backend: "supabase" (default) or "sqlite" for an embedded database at SQLITE_PATH
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "crypto.db")
+
 # Supabase and CoinGecko configuration, retrieving keys from environment variables
 SUPABASE_URL = os.getenv("SUPABASE_API_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -13,6 +17,111 @@ COINGECKO_API_URL = os.getenv("COINGECKO_API_URL")
 # Define the cryptocurrencies to track from the API
 CRYPTOCURRENCIES_TO_FETCH = ['bitcoin', 'ethereum', 'usd-coin', 'solana']
 
+# ETL extraction settings: number of concurrent workers and CoinGecko quota (requests per minute)
+ETL_MAX_WORKERS = int(os.getenv("ETL_MAX_WORKERS", 8))
+COINGECKO_RATE_LIMIT = float(os.getenv("COINGECKO_RATE_LIMIT", 30))
+COINGECKO_RATE_BURST = int(os.getenv("COINGECKO_RATE_BURST", 5))
+
+# Retry policy for CoinGecko requests (timeouts and backoff in seconds)
+HTTP_REQUEST_TIMEOUT = float(os.getenv("HTTP_REQUEST_TIMEOUT", 15))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 4))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 1))
+HTTP_BACKOFF_CAP = float(os.getenv("HTTP_BACKOFF_CAP", 30))
+HTTP_CIRCUIT_BREAKER_THRESHOLD = int(os.getenv("HTTP_CIRCUIT_BREAKER_THRESHOLD", 3))
+
+# On-disk cache of CoinGecko responses (set HTTP_CACHE_DIR to an empty value to disable it)
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", ".http_cache")
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+HTTP_CACHE_LIVE_TTL = float(os.getenv("HTTP_CACHE_LIVE_TTL", 30))                   # Current prices
+HTTP_CACHE_CHART_TTL = float(os.getenv("HTTP_CACHE_CHART_TTL", 300))                # Ranges that include today
+HTTP_CACHE_HISTORICAL_TTL = float(os.getenv("HTTP_CACHE_HISTORICAL_TTL", 30 * 86400))  # Closed historical days
+HTTP_CACHE_OFFLINE = os.getenv("HTTP_CACHE_OFFLINE", "false").lower() == "true"      # Replay cached responses only
+
+# Time budget for extracting one coin and for a whole ETL cycle (seconds)
+ETL_COIN_TIMEOUT = float(os.getenv("ETL_COIN_TIMEOUT", 60))
+ETL_CYCLE_TIMEOUT = float(os.getenv("ETL_CYCLE_TIMEOUT", 300))
+
+# Fetch current prices in batches from /coins/markets (up to 250 coins per page)
+ETL_USE_MARKETS_SNAPSHOT = os.getenv("ETL_USE_MARKETS_SNAPSHOT", "true").lower() == "true"
+COINGECKO_MARKETS_PAGE_SIZE = int(os.getenv("COINGECKO_MARKETS_PAGE_SIZE", 250))
+
+# Only request the days missing since the last stored historical price (first run fetches HISTORY_BOOTSTRAP_DAYS)
+ETL_INCREMENTAL_HISTORY = os.getenv("ETL_INCREMENTAL_HISTORY", "true").lower() == "true"
+HISTORY_BOOTSTRAP_DAYS = int(os.getenv("HISTORY_BOOTSTRAP_DAYS", 5))
+
+# Maximum number of historical price rows written per request
+HISTORY_LOAD_CHUNK_SIZE = int(os.getenv("HISTORY_LOAD_CHUNK_SIZE", 1000))
+
+# Read-through cache for repository queries, invalidated by the generation the ETL bumps after each load
+ETL_GENERATION_FILE = os.getenv("ETL_GENERATION_FILE", ".etl_generation")
+REPO_CACHE_MAX_ENTRIES = int(os.getenv("REPO_CACHE_MAX_ENTRIES", 1024))
+REPO_CACHE_TTL = float(os.getenv("REPO_CACHE_TTL", 300))
+
+# How far back an as-of price lookup may go before the price is considered missing (days)
+AS_OF_MAX_STALENESS_DAYS = int(os.getenv("AS_OF_MAX_STALENESS_DAYS", 3))
+
+# Maximum (coin, date) pairs per Supabase as-of query; each adds about 90 characters to the request URL
+AS_OF_LOOKUPS_PER_REQUEST = int(os.getenv("AS_OF_LOOKUPS_PER_REQUEST", 25))
+
+# Precompute the analytics at the end of each ETL cycle and serve them from versioned snapshots
+ETL_ANALYTICS_SNAPSHOTS = os.getenv("ETL_ANALYTICS_SNAPSHOTS", "true").lower() == "true"
+ANALYTICS_SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", ".analytics_snapshots")
+
+# Memory-mapped price snapshot written by the ETL and shared by every API worker (empty value disables it),
+# keeping the newest PRICE_SNAPSHOT_KEEP versions on disk
+PRICE_SNAPSHOT_DIR = os.getenv("PRICE_SNAPSHOT_DIR", ".price_snapshots")
+PRICE_SNAPSHOT_KEEP = int(os.getenv("PRICE_SNAPSHOT_KEEP", 3))
+
+# Rows per page when streaming or paginating historical prices
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 1000))
+
+# Live price stream (/crypto/stream/prices): how often each API worker checks for a new ETL generation, the
+# keep-alive period of idle connections (seconds) and the maximum number of connected clients per worker
+PRICE_STREAM_POLL_INTERVAL = float(os.getenv("PRICE_STREAM_POLL_INTERVAL", 1))
+PRICE_STREAM_KEEPALIVE = float(os.getenv("PRICE_STREAM_KEEPALIVE", 15))
+PRICE_STREAM_MAX_CLIENTS = int(os.getenv("PRICE_STREAM_MAX_CLIENTS", 10000))
+
+# Number of (coin, interval) series of closed OHLC candles kept in memory
+CANDLE_CACHE_MAX_ENTRIES = int(os.getenv("CANDLE_CACHE_MAX_ENTRIES", 512))
+
+# Continuous ETL cadence: tiers of coins with their own refresh interval in seconds, e.g.
+# "bitcoin,ethereum:30;usd-coin,solana:900". Tracked coins missing from ETL_TIERS refresh every ETL_INTERVAL seconds
+ETL_INTERVAL = float(os.getenv("ETL_INTERVAL", 60))
+ETL_TIERS = os.getenv("ETL_TIERS", "")
+ETL_SCHEDULE_JITTER = float(os.getenv("ETL_SCHEDULE_JITTER", 0.1))         # Random offset, as a fraction of the interval
+ETL_SCHEDULE_BATCH_SIZE = int(os.getenv("ETL_SCHEDULE_BATCH_SIZE", 50))    # Larger tiers are split into staggered batches
+# Minimum time between two publications (new generation, price snapshot and analytics) of the loads of --continuous
+# runs, so the batches of fast tiers do not each invalidate every cache and recompute every analysis (seconds)
+ETL_PUBLISH_INTERVAL = float(os.getenv("ETL_PUBLISH_INTERVAL", ETL_INTERVAL))
+
+# Backfill (run_etl.py --backfill): days per /market_chart/range request (ranges over 90 days return daily points),
+# and the file recording completed chunks so an interrupted backfill resumes where it stopped
+BACKFILL_CHUNK_DAYS = int(os.getenv("BACKFILL_CHUNK_DAYS", 365))
+BACKFILL_CHECKPOINT_FILE = os.getenv("BACKFILL_CHECKPOINT_FILE", ".backfill_checkpoint.json")
+
+# Dynamic coin universe: track the top N coins by market cap instead of CRYPTOCURRENCIES_TO_FETCH (0 disables it),
+# re-reading the list every ETL_UNIVERSE_REFRESH seconds, or ETL_UNIVERSE_RETRY seconds after a failed read
+ETL_UNIVERSE_SIZE = int(os.getenv("ETL_UNIVERSE_SIZE", 0))
+ETL_UNIVERSE_REFRESH = float(os.getenv("ETL_UNIVERSE_REFRESH", 3600))
+ETL_UNIVERSE_RETRY = float(os.getenv("ETL_UNIVERSE_RETRY", 300))
+
+# Sharded ETL workers (run_etl.py --worker / --workers N): coins are hashed into ETL_SHARDS shards, and each shard is
+# owned by one worker through a lease that expires ETL_LEASE_TTL seconds after its last renewal
+ETL_SHARDS = int(os.getenv("ETL_SHARDS", 32))
+ETL_LEASE_TTL = float(os.getenv("ETL_LEASE_TTL", 60))
+ETL_WORKER_ID = os.getenv("ETL_WORKER_ID", "")  # Defaults to <hostname>-<pid>
+# Shards refreshed since the sharded workers of this node last published their loads; the worker that completes the
+# round publishes once for all of them
+ETL_ROUND_FILE = os.getenv("ETL_ROUND_FILE", ".etl_round.json")
+
+# Port of the Prometheus /metrics endpoint served by run_etl.py (0 disables it; the API serves /metrics itself)
+ETL_METRICS_PORT = int(os.getenv("ETL_METRICS_PORT", 0))
+
+# Response compression: bodies of at least RESPONSE_COMPRESSION_MIN_BYTES are sent with brotli (if installed) or gzip
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", 1024))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 6))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", 4))
+
 # Server configuration
 HOST = os.getenv("HOST", "127.0.0.1")  
 PORT = int(os.getenv("PORT", 8000)) 
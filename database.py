@@ -1,4 +1,5 @@
-from supabase import create_client, Client
+import asyncio
+from supabase import create_client, Client, acreate_client, AsyncClient
 from config import SUPABASE_URL, SUPABASE_KEY
 
 class Database:
@@ -14,3 +15,21 @@ class Database:
 # Function to get the database instance
 def get_db():
     return Database.get_instance()
+
+class AsyncDatabase:
+    _instance = None  # Async client shared by every request; its HTTP connection pool is reused
+    _lock = None
+
+    @classmethod
+    async def get_instance(cls) -> AsyncClient:
+        # Create the lock lazily so it belongs to the running event loop
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls._instance is None:
+                cls._instance = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+        return cls._instance
+
+# Function to get the async database instance
+async def get_async_db():
+    return await AsyncDatabase.get_instance()
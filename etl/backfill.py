@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from config import BACKFILL_CHUNK_DAYS, BACKFILL_CHECKPOINT_FILE, ETL_MAX_WORKERS
+from etl import http_client
+from etl.coingecko_etl import (
+    extract_market_snapshot,
+    fetch_crypto_data,
+    fetch_historical_range,
+    transform_crypto_data,
+    transform_historical_data,
+    load_crypto_data,
+    load_historical_data,
+    publish_load,
+)
+from metrics import ETL_STAGE_SECONDS
+
+class BackfillCheckpoint:
+    """Chunks already loaded per coin, written after every chunk so an interrupted backfill resumes where it stopped."""
+
+    def __init__(self, path: str = BACKFILL_CHECKPOINT_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.done = {coin: set(chunks) for coin, chunks in json.load(f).items()}
+        except FileNotFoundError:
+            self.done = {}
+
+    @staticmethod
+    def chunk_key(start: datetime, end: datetime) -> str:
+        return f"{start.date().isoformat()}/{end.date().isoformat()}"
+
+    def is_done(self, coin: str, start: datetime, end: datetime) -> bool:
+        return self.chunk_key(start, end) in self.done.get(coin, ())
+
+    def mark_done(self, coin: str, start: datetime, end: datetime):
+        with self.lock:
+            self.done.setdefault(coin, set()).add(self.chunk_key(start, end))
+            # Write to a temporary file first so a crash never leaves a truncated checkpoint
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({coin: sorted(chunks) for coin, chunks in self.done.items()}, f)
+            os.replace(tmp_path, self.path)
+
+# Split [start, end) into consecutive chunks of at most `chunk_days` days
+def plan_chunks(start: datetime, end: datetime, chunk_days: int = BACKFILL_CHUNK_DAYS):
+    chunks = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+# Fetch, transform and load one chunk of one coin, then record it in the checkpoint
+def backfill_chunk(coingecko_id, crypto_id, start, end, checkpoint, breaker):
+    raw = fetch_historical_range(coingecko_id, start, end, breaker=breaker)
+    # A chunk before the coin was listed has no prices; it is still complete
+    rows = transform_historical_data(raw, crypto_id, coingecko_id) if raw["prices"] else []
+    if rows:
+        load_historical_data(rows)
+    checkpoint.mark_done(coingecko_id, start, end)
+    return len(rows)
+
+# Backfill the daily history of many coins between two dates, fetching chunks in parallel within the rate limit
+def run_backfill(crypto_ids, start, end=None, chunk_days=BACKFILL_CHUNK_DAYS, max_workers=ETL_MAX_WORKERS, checkpoint_path=BACKFILL_CHECKPOINT_FILE):
+    # Whole UTC days only, so chunk boundaries (and checkpoint keys) are stable between runs
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
+    end = end.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc) if end else today
+    chunks = plan_chunks(start, end, chunk_days)
+    checkpoint = BackfillCheckpoint(checkpoint_path)
+    started = time.perf_counter()
+
+    # Step 1: Load the coins first, since historical rows reference their database IDs
+    snapshot = extract_market_snapshot(crypto_ids)
+    cryptos = []
+    for crypto_id in crypto_ids:
+        try:
+            cryptos.append(snapshot[crypto_id] if crypto_id in snapshot else transform_crypto_data(fetch_crypto_data(crypto_id)))
+        except Exception as e:
+            print(f"Error extracting data for {crypto_id}, skipping its backfill: {str(e)}")
+    db_crypto_ids = load_crypto_data(cryptos)
+
+    # Step 2: Fetch and load every chunk that is not in the checkpoint yet; the shared rate limiter paces the requests
+    tasks = [
+        (coingecko_id, chunk_start, chunk_end)
+        for coingecko_id in crypto_ids if coingecko_id in db_crypto_ids
+        for chunk_start, chunk_end in chunks
+        if not checkpoint.is_done(coingecko_id, chunk_start, chunk_end)
+    ]
+    skipped = len(db_crypto_ids) * len(chunks) - len(tasks)
+    print(f"Backfilling {len(tasks)} chunks ({skipped} already done) of up to {chunk_days} days from {start.date()} to {end.date()}.")
+
+    breaker = http_client.CircuitBreaker()
+    loaded_rows = failed = completed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(backfill_chunk, coingecko_id, db_crypto_ids[coingecko_id], chunk_start, chunk_end, checkpoint, breaker):
+                (coingecko_id, chunk_start, chunk_end)
+            for coingecko_id, chunk_start, chunk_end in tasks
+        }
+        for future in as_completed(futures):
+            coingecko_id, chunk_start, chunk_end = futures[future]
+            try:
+                loaded_rows += future.result()
+                completed += 1
+            except Exception as e:
+                failed += 1
+                print(f"Error backfilling {coingecko_id} from {chunk_start.date()} to {chunk_end.date()}: {str(e)}")
+            if (completed + failed) % 50 == 0:
+                print(f"Backfill progress: {completed + failed}/{len(tasks)} chunks, {loaded_rows} rows")
+
+    # Publish like any other load: a new generation, the price snapshot rebuilt from scratch and the analytics
+    if loaded_rows:
+        publish_load()
+
+    elapsed = time.perf_counter() - started
+    ETL_STAGE_SECONDS.observe(elapsed, stage="backfill")
+    print(
+        f"Backfill completed in {elapsed:.1f}s: {completed} chunks and {loaded_rows} rows loaded, {failed} chunks failed. "
+        + ("Run it again to retry the failed chunks." if failed else "")
+    )
+    return {"chunks": completed, "rows": loaded_rows, "failed": failed, "skipped": skipped}
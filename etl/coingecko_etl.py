@@ -1,51 +1,133 @@
-import requests
+import json
+import threading
 import time
-from datetime import datetime, timedelta
-from database import get_db
-from config import COINGECKO_API_URL
-from repositories.crypto_repository import CryptoRepository
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from config import (
+    COINGECKO_API_URL,
+    ETL_MAX_WORKERS,
+    ETL_USE_MARKETS_SNAPSHOT,
+    COINGECKO_MARKETS_PAGE_SIZE,
+    ETL_INCREMENTAL_HISTORY,
+    HISTORY_BOOTSTRAP_DAYS,
+    HISTORY_LOAD_CHUNK_SIZE,
+    ETL_COIN_TIMEOUT,
+    ETL_CYCLE_TIMEOUT,
+    ETL_ANALYTICS_SNAPSHOTS,
+    ETL_PUBLISH_INTERVAL,
+    PRICE_SNAPSHOT_DIR,
+)
+from etl import http_client
+from repositories.factory import get_repository
+from repositories.cache import bump_generation
+from repositories.snapshot_store import get_snapshot_store
+from repositories.price_store import build_price_columns
+from repositories.price_snapshot import (
+    get_price_snapshot_reader,
+    merge_price_columns,
+    snapshot_write_lock,
+    write_price_snapshot,
+)
+from use_cases.crypto_use_cases import (
+    CalculateMarketDominanceUseCase,
+    CalculateVolatilityUseCase,
+    GetHighestVolumeCryptoUseCase,
+    CalculateCorrelationMatrixUseCase,
+)
 from models.cryptocurrency import Cryptocurrency
+from metrics import ETL_STAGE_SECONDS, ETL_COIN_SECONDS, ETL_CYCLES, ETL_COIN_FAILURES
+
+# Date of the latest stored historical price per coingecko_id, kept between ETL cycles
+_history_watermarks = {}
 
 # Fetch current cryptocurrency data from the CoinGecko API
-def fetch_crypto_data(crypto_id):
-    try:
-        response = requests.get(f"{COINGECKO_API_URL}/coins/{crypto_id}")
-        response.raise_for_status()  # Raises an exception for HTTP error codes (4XX/5XX)
-        data = response.json()
-        
-        # Check that the response contains the 'id' key
-        if 'id' not in data:
-            raise KeyError(f"'id' key not found in response for {crypto_id}. Full response: {data}")
-        
-        return data
-    except requests.exceptions.RequestException as e:
-        print(f"Network error when fetching data for {crypto_id}: {str(e)}")
-        time.sleep(5)  # Wait 5 seconds before retrying
-        return fetch_crypto_data(crypto_id)  # Retry the request
+def fetch_crypto_data(crypto_id, deadline=None, breaker=None):
+    data = http_client.get_json(f"{COINGECKO_API_URL}/coins/{crypto_id}", key=crypto_id, deadline=deadline, breaker=breaker)
+
+    # Check that the response contains the 'id' key
+    if 'id' not in data:
+        raise KeyError(f"'id' key not found in response for {crypto_id}. Full response: {data}")
+
+    return data
+
+# Fetch one page of market data (price, market cap and volume) from the /coins/markets endpoint
+def fetch_market_data(crypto_ids=None, page=1, per_page=COINGECKO_MARKETS_PAGE_SIZE, deadline=None):
+    params = {
+        "vs_currency": "usd",         # Reference currency
+        "order": "market_cap_desc",   # Largest coins first when paging through the whole market
+        "per_page": per_page,
+        "page": page
+    }
+    if crypto_ids:
+        params["ids"] = ",".join(crypto_ids)
+
+    data = http_client.get_json(f"{COINGECKO_API_URL}/coins/markets", params=params, deadline=deadline)
+
+    # The endpoint returns a list of market rows
+    if not isinstance(data, list):
+        raise KeyError(f"Unexpected response from /coins/markets. Full response: {data}")
+
+    return data
+
+# Fetch market data for a list of cryptocurrencies, one request per page of ids
+def fetch_market_snapshot(crypto_ids, per_page=COINGECKO_MARKETS_PAGE_SIZE, deadline=None):
+    rows = []
+    for start in range(0, len(crypto_ids), per_page):
+        rows.extend(fetch_market_data(crypto_ids[start:start + per_page], per_page=per_page, deadline=deadline))
+    return rows
+
+# Fetch the top cryptocurrencies by market cap, paging through /coins/markets until the limit is reached
+def fetch_top_market_data(limit, per_page=COINGECKO_MARKETS_PAGE_SIZE, deadline=None):
+    rows = []
+    page = 1
+    while len(rows) < limit:
+        page_rows = fetch_market_data(page=page, per_page=per_page, deadline=deadline)
+        rows.extend(page_rows)
+        if len(page_rows) < per_page:
+            break  # Last page reached
+        page += 1
+    return rows[:limit]
 
 # Fetch historical price data from the CoinGecko API
-def fetch_historical_data(crypto_id, days=5):
-    try:
-        response = requests.get(
-            f"{COINGECKO_API_URL}/coins/{crypto_id}/market_chart",
-            params={
-                "vs_currency": "usd",  # Reference currency
-                "days": days,          # Time period in days
-                "interval": "daily"    # Daily data
-            }
-        )
-        response.raise_for_status()
-        data = response.json()
-
-        # Verify that the data includes the 'prices' key
-        if "prices" not in data:
-            raise KeyError(f"'prices' key not found in historical data for {crypto_id}. Full response: {data}")
-
-        return data
-    except requests.exceptions.RequestException as e:
-        print(f"Network error when fetching historical data for {crypto_id}: {str(e)}")
-        time.sleep(5)  # Wait 5 seconds before retrying
-        return fetch_historical_data(crypto_id, days)
+def fetch_historical_data(crypto_id, days=HISTORY_BOOTSTRAP_DAYS, deadline=None, breaker=None):
+    data = http_client.get_json(
+        f"{COINGECKO_API_URL}/coins/{crypto_id}/market_chart",
+        params={
+            "vs_currency": "usd",  # Reference currency
+            "days": days,          # Time period in days
+            "interval": "daily"    # Daily data
+        },
+        key=crypto_id,
+        deadline=deadline,
+        breaker=breaker
+    )
+
+    # Verify that the data includes the 'prices' key
+    if "prices" not in data:
+        raise KeyError(f"'prices' key not found in historical data for {crypto_id}. Full response: {data}")
+
+    return data
+
+# Fetch historical price data between two dates from the /market_chart/range endpoint
+def fetch_historical_range(crypto_id, start, end, deadline=None, breaker=None):
+    data = http_client.get_json(
+        f"{COINGECKO_API_URL}/coins/{crypto_id}/market_chart/range",
+        params={
+            "vs_currency": "usd",             # Reference currency
+            "from": int(start.timestamp()),   # UNIX timestamps; ranges over 90 days return daily points
+            "to": int(end.timestamp())
+        },
+        key=crypto_id,
+        deadline=deadline,
+        breaker=breaker
+    )
+
+    # Verify that the data includes the 'prices' key
+    if "prices" not in data:
+        raise KeyError(f"'prices' key not found in historical range for {crypto_id}. Full response: {data}")
+
+    return data
 
 # Transform the current cryptocurrency data into a database model
 def transform_crypto_data(raw_data):
@@ -63,66 +145,327 @@ def transform_crypto_data(raw_data):
         last_updated=datetime.now()
     )
 
+# Transform a /coins/markets row into a database model
+def transform_market_data(row):
+    # Validate the data structure
+    if row.get("current_price") is None:
+        raise KeyError(f"Missing 'current_price' in market row for {row.get('id')}")
+
+    return Cryptocurrency(
+        coingecko_id=row["id"],
+        symbol=row["symbol"].upper(),
+        name=row["name"],
+        current_price=row["current_price"],
+        market_cap=row.get("market_cap") or 0.0,
+        total_volume=row.get("total_volume") or 0.0,
+        last_updated=datetime.now()
+    )
+
 # Transform the historical data into a format suitable for the 'historical_prices' table
-def transform_historical_data(raw_data, crypto_id, coingecko_id):
+def transform_historical_data(raw_data, crypto_id, coingecko_id, since=None):
     # Validate the presence of the 'prices' key in the data
     if "prices" not in raw_data or not raw_data["prices"]:
         raise KeyError(f"Data from API is missing 'prices'. Raw data: {raw_data}")
-    
-    return [
-        {
+
+    # Keep one row per day (UTC); the last sample of a day wins, so today's row tracks the latest price
+    rows = {}
+    for price, market_cap, volume in zip(
+        raw_data["prices"],
+        raw_data["market_caps"],
+        raw_data["total_volumes"]
+    ):
+        day = datetime.fromtimestamp(price[0] / 1000, tz=timezone.utc).date()
+        if since and day < since.date():
+            continue  # Already stored in a previous run
+        rows[day] = {
             "crypto_id": crypto_id,
             "coingecko_id": coingecko_id,
-            "date": datetime.fromtimestamp(price[0] / 1000).isoformat(),  # Convert date to ISO format
+            "date": datetime(day.year, day.month, day.day).isoformat(),  # Start of the day in ISO format
             "close_price": price[1],
             "total_volume": volume[1],
             "market_cap": market_cap[1]
         }
-        for price, market_cap, volume in zip(
-            raw_data["prices"],
-            raw_data["market_caps"],
-            raw_data["total_volumes"]
-        )
-    ]
-
-# Load the transformed cryptocurrency data into the database
-def load_crypto_data(data):
-    repo = CryptoRepository()
-    result = repo.upsert_cryptocurrency(data)
-    
-    # Access the first element in result.data
-    return result.data[0]['id']
-
-# Insert the transformed historical data into the 'historical_prices' table
-def load_historical_data(data):
-    db = get_db()
-    print("Data to be inserted:", data)
-    db.table("historical_prices").insert(data).execute()
-
-# Main ETL function that coordinates the process for each cryptocurrency in the list
-def run_etl(crypto_ids):
-    for crypto_id in crypto_ids:
+    return list(rows.values())
+
+# Watermarks are naive UTC datetimes; the database may return timezone-aware ones
+def as_naive_utc(value):
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# Get the date of the latest stored historical price for a coin, querying the database only once per process
+def get_history_watermark(coingecko_id):
+    if coingecko_id not in _history_watermarks:
+        _history_watermarks[coingecko_id] = as_naive_utc(get_repository().get_latest_historical_date(coingecko_id))
+    return _history_watermarks[coingecko_id]
+
+# Record the latest loaded date so the next cycle only requests newer data
+def update_history_watermark(coingecko_id, rows):
+    if rows:
+        latest = max(as_naive_utc(datetime.fromisoformat(row["date"])) for row in rows)
+        current = _history_watermarks.get(coingecko_id)
+        _history_watermarks[coingecko_id] = max(latest, current) if current else latest
+
+# Number of days to request so that the range covers everything after the watermark
+def history_days_to_fetch(watermark):
+    if watermark is None:
+        return HISTORY_BOOTSTRAP_DAYS
+    missing_days = (datetime.now(timezone.utc).date() - watermark.date()).days
+    return max(1, missing_days)
+
+# Load the transformed cryptocurrency data in a single upsert and map each coingecko_id to its database ID
+def load_crypto_data(cryptos):
+    repo = get_repository()
+    rows = repo.upsert_cryptocurrencies(cryptos)
+    return {row['coingecko_id']: row['id'] for row in rows}
+
+# Insert or update the transformed historical data in the 'historical_prices' table, in bounded chunks
+def load_historical_data(data, chunk_size=HISTORY_LOAD_CHUNK_SIZE):
+    repo = get_repository()
+    print(f"Upserting {len(data)} historical price rows in chunks of {chunk_size}.")
+    for start in range(0, len(data), chunk_size):
+        repo.upsert_historical_prices(data[start:start + chunk_size])
+
+# Fetch the current data of many cryptocurrencies in batches, skipping rows that cannot be transformed
+def extract_market_snapshot(crypto_ids, deadline=None):
+    snapshot = {}
+    try:
+        for row in fetch_market_snapshot(crypto_ids, deadline=deadline):
+            try:
+                crypto = transform_market_data(row)
+                snapshot[crypto.coingecko_id] = crypto
+            except Exception as e:
+                print(f"Skipping market row for {row.get('id')}: {str(e)}")
+    except Exception as e:
+        print(f"Error fetching market snapshot, falling back to single-coin requests: {str(e)}")
+    return snapshot
+
+# Extract the current and historical data for a single cryptocurrency
+def extract_crypto_data(crypto_id, snapshot, cycle_deadline, breaker, incremental=ETL_INCREMENTAL_HISTORY, coin_seconds=None):
+    # Each coin gets its own time budget, bounded by what is left of the cycle
+    deadline = min(cycle_deadline, time.monotonic() + ETL_COIN_TIMEOUT)
+
+    start = time.perf_counter()
+    try:
+        # Only request the full /coins/{id} document when the batch call did not return the coin
+        if crypto_id in snapshot:
+            transformed_crypto = snapshot[crypto_id]
+        else:
+            transformed_crypto = transform_crypto_data(fetch_crypto_data(crypto_id, deadline, breaker))
+
+        # Only request the days that are not stored yet
+        watermark = get_history_watermark(transformed_crypto.coingecko_id) if incremental else None
+        historical_data = fetch_historical_data(crypto_id, history_days_to_fetch(watermark), deadline, breaker)
+    finally:
+        # The histogram has no coin label, so its size does not grow with the universe; per-coin times go to the log
+        elapsed = time.perf_counter() - start
+        ETL_COIN_SECONDS.observe(elapsed)
+        if coin_seconds is not None:
+            coin_seconds[crypto_id] = round(elapsed, 4)
+    return transformed_crypto, historical_data, watermark
+
+# Analytics precomputed after each load, served by the API until the next generation
+ANALYTICS_SNAPSHOTS = {
+    "market-dominance": CalculateMarketDominanceUseCase.execute,
+    "volatility": CalculateVolatilityUseCase.execute,
+    "volume": GetHighestVolumeCryptoUseCase.execute,
+    "correlation-matrix": CalculateCorrelationMatrixUseCase.execute,
+}
+
+# Compute every analytics snapshot once for the data of the given generation
+def build_analytics_snapshots(generation):
+    store = get_snapshot_store()
+    for name, compute in ANALYTICS_SNAPSHOTS.items():
         try:
-            # Step 1: Extract data from the API
-            crypto_data = fetch_crypto_data(crypto_id)
-            historical_data = fetch_historical_data(crypto_id)
+            store.save(name, compute(), generation)
+        except Exception as e:
+            print(f"Error computing the '{name}' analytics snapshot: {str(e)}")
 
-            # Step 2: Transform the extracted data
-            transformed_crypto = transform_crypto_data(crypto_data)
+# Publish the memory-mapped price snapshot: the previous version merged with the rows loaded in this cycle, or a
+# full export from the database when the previous version is not the preceding generation (another process loaded
+# rows in between, or there is none) or no rows are given, e.g. after a backfill. Returns None if a newer
+# generation is already published
+def publish_price_snapshot(generation, history_rows=None):
+    repo = get_repository()
+    with snapshot_write_lock():
+        previous = get_price_snapshot_reader().get()
+        if previous is not None and previous.generation >= generation:
+            print(f"Skipping price snapshot of generation {generation}: generation {previous.generation} is already published")
+            return None
 
-            # Step 3: Load cryptocurrency data and get its ID in the database
-            db_crypto_id = load_crypto_data(transformed_crypto)
+        cryptos = repo.get_all_cryptocurrencies()
+        if history_rows is None or previous is None or previous.generation != generation - 1:
+            columns = build_price_columns(repo.get_historical_price_rows([crypto.id for crypto in cryptos]))
+        else:
+            # No other writer can swap CURRENT while the lock is held, so these are the columns of `previous`
+            columns = merge_price_columns(get_price_snapshot_reader().read_columns(), build_price_columns(history_rows))
+        return write_price_snapshot(columns, [crypto.model_dump(mode="json") for crypto in cryptos], generation)
 
-            # Get coingecko_id for historical data
-            coingecko_id = transformed_crypto.coingecko_id
+# Time an ETL stage into the stage histogram and the timings of the current cycle
+@contextmanager
+def timed_stage(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(time.perf_counter() - start, 4)
+        ETL_STAGE_SECONDS.observe(timings[stage], stage=stage)
+
+# Number of slowest coins listed in the cycle log line
+SLOWEST_COINS_LOGGED = 5
 
-            # Transform and load historical data
-            transformed_history = transform_historical_data(historical_data, db_crypto_id, coingecko_id)
-            load_historical_data(transformed_history)
+# Log one structured line per cycle so slow stages and coins can be spotted without a metrics backend
+def log_cycle_timings(status, timings, coins, loaded, rows, coin_seconds=None):
+    ETL_CYCLES.inc(status=status)
+    slowest = sorted((coin_seconds or {}).items(), key=lambda item: item[1], reverse=True)[:SLOWEST_COINS_LOGGED]
+    print("ETL cycle timings: " + json.dumps({
+        "status": status,
+        "coins": coins,
+        "loaded": loaded,
+        "history_rows": rows,
+        "seconds": timings,
+        "slowest_coins": dict(slowest),
+    }))
 
-            print(f"ETL process for {crypto_id} completed successfully.")
+# Publish loaded data: a new generation so API workers drop their cached reads, the price snapshot they
+# memory-map and the precomputed analytics. Without `history_rows` the price snapshot is exported in full
+def publish_load(history_rows=None, analytics_snapshots=ETL_ANALYTICS_SNAPSHOTS, timings=None):
+    timings = {} if timings is None else timings
+    generation = bump_generation()
 
+    if PRICE_SNAPSHOT_DIR:
+        try:
+            with timed_stage(timings, "price_snapshot"):
+                publish_price_snapshot(generation, history_rows)
         except Exception as e:
-            print(f"Error during ETL process for {crypto_id}: {str(e)}")
+            print(f"Error publishing the price snapshot: {str(e)}")
+
+    if analytics_snapshots:
+        with timed_stage(timings, "analytics_snapshots"):
+            build_analytics_snapshots(generation)
+    return generation
+
+# Main ETL function that coordinates the process for each cryptocurrency in the list. Returns the loaded history
+# rows, or None if the cycle failed. With publish=False the caller publishes the load later (see LoadPublisher)
+def run_etl(crypto_ids, max_workers=ETL_MAX_WORKERS, use_markets_snapshot=ETL_USE_MARKETS_SNAPSHOT, analytics_snapshots=ETL_ANALYTICS_SNAPSHOTS,
+            publish=True):
+    # Bound the whole cycle; a coin that keeps failing is skipped by the circuit breaker until the next cycle
+    cycle_deadline = time.monotonic() + ETL_CYCLE_TIMEOUT
+    breaker = http_client.CircuitBreaker()
+    timings = {}
+    cycle_start = time.perf_counter()
+
+    # Step 1a: Extract current prices in batches from /coins/markets
+    with timed_stage(timings, "extract_markets"):
+        snapshot = extract_market_snapshot(crypto_ids, cycle_deadline) if use_markets_snapshot else {}
+
+    # Step 1b: Extract the remaining data from the API concurrently; the shared rate limiter keeps us within quota
+    extracted = []
+    coin_seconds = {}
+    with timed_stage(timings, "extract"), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(extract_crypto_data, crypto_id, snapshot, cycle_deadline, breaker, coin_seconds=coin_seconds): crypto_id
+            for crypto_id in crypto_ids
+        }
+        for future in as_completed(futures):
+            crypto_id = futures[future]
+            try:
+                extracted.append(future.result())
+            except Exception as e:
+                ETL_COIN_FAILURES.inc(stage="extract")
+                print(f"Error extracting data for {crypto_id}: {str(e)}")
+
+    # Step 2: Load all cryptocurrency data in one request and get their IDs in the database
+    try:
+        with timed_stage(timings, "load_cryptocurrencies"):
+            db_crypto_ids = load_crypto_data([transformed_crypto for transformed_crypto, _, _ in extracted])
+    except Exception as e:
+        print(f"Error loading cryptocurrency data: {str(e)}")
+        log_cycle_timings("failed", timings, len(crypto_ids), 0, 0, coin_seconds)
+        return None
+
+    # Step 3: Transform the historical data of every coin using the IDs from the same batch
+    history_rows = []
+    loaded_history = []
+    with timed_stage(timings, "transform_history"):
+        for transformed_crypto, historical_data, watermark in extracted:
+            coingecko_id = transformed_crypto.coingecko_id
+            try:
+                transformed_history = transform_historical_data(
+                    historical_data, db_crypto_ids[coingecko_id], coingecko_id, since=watermark
+                )
+                history_rows.extend(transformed_history)
+                loaded_history.append((coingecko_id, transformed_history))
+            except Exception as e:
+                ETL_COIN_FAILURES.inc(stage="transform")
+                print(f"Error transforming historical data for {coingecko_id}: {str(e)}")
+
+    # Step 4: Load the historical data in chunks and advance the watermarks
+    try:
+        with timed_stage(timings, "load_history"):
+            load_historical_data(history_rows)
+    except Exception as e:
+        print(f"Error loading historical data: {str(e)}")
+        log_cycle_timings("failed", timings, len(crypto_ids), 0, len(history_rows), coin_seconds)
+        return None
+
+    for coingecko_id, transformed_history in loaded_history:
+        update_history_watermark(coingecko_id, transformed_history)
+
+    # Step 5: Publish the new generation, the price snapshot and the analytics
+    if publish:
+        publish_load(history_rows, analytics_snapshots, timings)
+
+    timings["total"] = round(time.perf_counter() - cycle_start, 4)
+    ETL_STAGE_SECONDS.observe(timings["total"], stage="total")
+    log_cycle_timings("success", timings, len(crypto_ids), len(loaded_history), len(history_rows), coin_seconds)
+    print(f"ETL process completed for {len(loaded_history)} of {len(crypto_ids)} cryptocurrencies.")
+    return history_rows
+
+class LoadPublisher:
+    """
+    Publishes the loads of several ETL runs together, at most once every `min_interval` seconds. Each publication
+    drops every API cache, rewrites the price snapshot and recomputes every analysis, so frequent small runs (e.g.
+    the batches of a fast tier) share one instead of paying for it each time.
+    """
+
+    def __init__(self, min_interval: float = ETL_PUBLISH_INTERVAL, analytics_snapshots=ETL_ANALYTICS_SNAPSHOTS, clock=time.monotonic):
+        self.min_interval = min_interval
+        self.analytics_snapshots = analytics_snapshots
+        self.clock = clock
+        self.pending_rows = None  # (crypto_id, date) -> latest row loaded since the last publication; None if nothing is pending
+        self.published_at = None
+        self.lock = threading.Lock()
+
+    def add(self, history_rows):
+        """Records the rows of a successful run; they are published by the next publish_due()."""
+        with self.lock:
+            if self.pending_rows is None:
+                self.pending_rows = {}
+            # A row loaded again (e.g. today's price) replaces the pending one
+            self.pending_rows.update(((row["crypto_id"], row["date"]), row) for row in history_rows)
+
+    def next_due(self):
+        """Returns when the pending load may be published (clock time), or None if nothing is pending."""
+        with self.lock:
+            if self.pending_rows is None:
+                return None
+            return self.published_at + self.min_interval if self.published_at is not None else self.clock()
+
+    def publish_due(self, force: bool = False):
+        """Publishes the pending load if the minimum interval has passed (or `force`); returns the new generation."""
+        with self.lock:
+            due = self.pending_rows is not None and (
+                force or self.published_at is None or self.clock() - self.published_at >= self.min_interval
+            )
+            if not due:
+                return None
+            history_rows, self.pending_rows = list(self.pending_rows.values()), None
+            self.published_at = self.clock()
 
-    print("ETL process completed for all cryptocurrencies.")
+        timings = {}
+        start = time.perf_counter()
+        generation = publish_load(history_rows, self.analytics_snapshots, timings)
+        timings["total"] = round(time.perf_counter() - start, 4)
+        print("ETL publish timings: " + json.dumps({"generation": generation, "history_rows": len(history_rows), "seconds": timings}))
+        return generation
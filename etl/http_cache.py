@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from config import (
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_MAX_BYTES,
+    HTTP_CACHE_LIVE_TTL,
+    HTTP_CACHE_CHART_TTL,
+    HTTP_CACHE_HISTORICAL_TTL,
+)
+
+class ResponseCache:
+    """Size-bounded on-disk cache of JSON responses, evicting the least recently used entries."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = None  # Computed lazily from the files on disk
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(url, params=None):
+        """Builds a stable cache key from the URL and the query parameters."""
+        raw = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Returns the stored entry for a key (fresh or not), or None when it is not cached."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)  # Mark as recently used for LRU eviction
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def is_fresh(entry):
+        return entry["expires_at"] > time.time()
+
+    def put(self, key, body, ttl, etag=None, last_modified=None):
+        """Stores a response body with its validators and expiry time."""
+        entry = {
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires_at": time.time() + ttl,
+        }
+        self._write(key, entry)
+
+    def refresh(self, key, entry, ttl):
+        """Extends the expiry of an entry after the server confirmed it is unchanged (HTTP 304)."""
+        entry["expires_at"] = time.time() + ttl
+        self._write(key, entry)
+
+    def _write(self, key, entry):
+        path = self._path(key)
+        data = json.dumps(entry).encode()
+        with self.lock:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            # Write to a temporary file first so readers in other processes never see a partial entry
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            if self.total_bytes is None:
+                self.total_bytes = self._disk_usage()
+            else:
+                self.total_bytes += len(data) - previous_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Removed by another process
+                yield path, stat.st_mtime, stat.st_size
+
+    def _disk_usage(self):
+        return sum(size for _, _, size in self._entries())
+
+    def _evict(self):
+        # Remove the least recently used entries until the cache is back under 90% of its budget
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self.total_bytes = total
+
+# Pick how long a response stays fresh: closed historical ranges never change, live data changes constantly
+def ttl_for(url, params=None):
+    params = params or {}
+    if "/market_chart/range" in url:
+        start_of_today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        if float(params.get("to", 0)) < start_of_today.timestamp():
+            return HTTP_CACHE_HISTORICAL_TTL
+        return HTTP_CACHE_CHART_TTL
+    if "/market_chart" in url:
+        return HTTP_CACHE_CHART_TTL
+    return HTTP_CACHE_LIVE_TTL
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Function to get the shared response cache, or None when caching is disabled
+def get_response_cache():
+    global _cache
+    if not HTTP_CACHE_DIR:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES)
+        return _cache
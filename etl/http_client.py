@@ -0,0 +1,223 @@
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    COINGECKO_RATE_LIMIT,
+    COINGECKO_RATE_BURST,
+    ETL_MAX_WORKERS,
+    HTTP_REQUEST_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_BASE,
+    HTTP_BACKOFF_CAP,
+    HTTP_CIRCUIT_BREAKER_THRESHOLD,
+    HTTP_CACHE_OFFLINE,
+)
+from etl.http_cache import get_response_cache, ttl_for
+from metrics import UPSTREAM_REQUEST_SECONDS, UPSTREAM_RETRIES, UPSTREAM_CACHE
+
+class FetchError(Exception):
+    """Raised when a CoinGecko request cannot be completed."""
+
+class DeadlineExceeded(FetchError):
+    """Raised when a request would not finish before its deadline."""
+
+class CircuitOpenError(FetchError):
+    """Raised when a key has failed too often during the current cycle."""
+
+class RetryableResponse(Exception):
+    """Internal signal for HTTP responses worth retrying (429 and 5XX)."""
+
+    def __init__(self, response, retry_after=None):
+        super().__init__(f"HTTP {response.status_code} for {response.url}")
+        self.status_code = response.status_code
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """Token bucket shared by every thread that calls the CoinGecko API."""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate = rate_per_minute / 60.0  # Tokens added per second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """Blocks until a token is available and consumes it; raises if the deadline would pass first."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                # Refill the bucket according to the time elapsed since the last call
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise DeadlineExceeded("Rate limit budget exhausted before the deadline")
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """Counts failures per key (usually a coin) during one ETL cycle and opens after a threshold."""
+
+    def __init__(self, failure_threshold: int = HTTP_CIRCUIT_BREAKER_THRESHOLD):
+        self.failure_threshold = failure_threshold
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def is_open(self, key):
+        with self.lock:
+            return self.failures.get(key, 0) >= self.failure_threshold
+
+    def record_failure(self, key):
+        with self.lock:
+            self.failures[key] = self.failures.get(key, 0) + 1
+
+    def record_success(self, key):
+        with self.lock:
+            self.failures.pop(key, None)
+
+class CoinGeckoClient:
+    _session = None  # Shared HTTP session with pooled keep-alive connections
+    _rate_limiter = None  # Shared token bucket for the whole process
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        # Create the session once, sizing the connection pool to the number of ETL workers
+        with cls._lock:
+            if cls._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=ETL_MAX_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls._session = session
+            return cls._session
+
+    @classmethod
+    def get_rate_limiter(cls) -> RateLimiter:
+        with cls._lock:
+            if cls._rate_limiter is None:
+                cls._rate_limiter = RateLimiter(COINGECKO_RATE_LIMIT, COINGECKO_RATE_BURST)
+            return cls._rate_limiter
+
+# Collapse coin IDs so metrics are labelled per endpoint (e.g. /coins/{id}/market_chart), not per coin
+def endpoint_label(url):
+    path = urlparse(url).path.split("/api/v3", 1)[-1]
+    return re.sub(r"/coins/(?!markets$)[^/]+", "/coins/{id}", path)
+
+# Perform a rate-limited GET request through the shared session
+def get(url, params=None, timeout=HTTP_REQUEST_TIMEOUT, deadline=None, headers=None):
+    CoinGeckoClient.get_rate_limiter().acquire(deadline)
+    # Time the request itself; waiting for a rate limiter token is not upstream latency
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = CoinGeckoClient.get_session().get(url, params=params, timeout=timeout, headers=headers)
+        status = str(response.status_code)
+        return response
+    finally:
+        UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint_label(url), status=status)
+
+# Parse a Retry-After header, given either in seconds or as an HTTP date
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+# Capped exponential backoff with full jitter
+def backoff_delay(attempt):
+    return random.uniform(0, min(HTTP_BACKOFF_CAP, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+# GET a JSON document, retrying transient failures within the deadline and the circuit breaker limits
+def get_json(url, params=None, key=None, deadline=None, breaker=None, max_retries=HTTP_MAX_RETRIES):
+    # Serve fresh responses from the local cache; stale ones are revalidated with their validators
+    cache = get_response_cache()
+    cache_key = cached = None
+    headers = {}
+    endpoint = endpoint_label(url)
+    if cache:
+        cache_key = cache.make_key(url, params)
+        cached = cache.get(cache_key)
+        if cached and (HTTP_CACHE_OFFLINE or cache.is_fresh(cached)):
+            UPSTREAM_CACHE.inc(endpoint=endpoint, result="hit")
+            return cached["body"]
+        UPSTREAM_CACHE.inc(endpoint=endpoint, result="stale" if cached else "miss")
+        if HTTP_CACHE_OFFLINE:
+            raise FetchError(f"{url} is not cached and offline replay is enabled")
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    attempt = 0
+    while True:
+        if breaker and key and breaker.is_open(key):
+            raise CircuitOpenError(f"Circuit open for {key}; skipping for the rest of the cycle")
+
+        timeout = HTTP_REQUEST_TIMEOUT
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"Deadline exceeded before requesting {url}")
+            timeout = min(timeout, remaining)
+
+        try:
+            response = get(url, params=params, timeout=timeout, deadline=deadline, headers=headers)
+
+            # The cached copy is still valid; extend its lifetime without downloading the body again
+            if response.status_code == 304 and cached:
+                cache.refresh(cache_key, cached, ttl_for(url, params))
+                UPSTREAM_CACHE.inc(endpoint=endpoint, result="revalidated")
+                if breaker and key:
+                    breaker.record_success(key)
+                return cached["body"]
+
+            # Rate limiting and server errors are transient; other client errors are not
+            if response.status_code == 429 or response.status_code >= 500:
+                raise RetryableResponse(response, parse_retry_after(response.headers.get("Retry-After")))
+            response.raise_for_status()
+            data = response.json()
+            if cache:
+                cache.put(
+                    cache_key,
+                    data,
+                    ttl_for(url, params),
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified")
+                )
+            if breaker and key:
+                breaker.record_success(key)
+            return data
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, RetryableResponse) as e:
+            if breaker and key:
+                breaker.record_failure(key)
+            if attempt >= max_retries:
+                raise FetchError(f"Giving up on {url} after {attempt + 1} attempts: {e}") from e
+
+            # Honor Retry-After when the server sends it, otherwise back off exponentially
+            delay = getattr(e, "retry_after", None)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise DeadlineExceeded(f"Retrying {url} in {delay:.1f}s would exceed the deadline") from e
+
+            print(f"Transient error for {url} (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+            UPSTREAM_RETRIES.inc(endpoint=endpoint, reason=getattr(e, "status_code", None) or type(e).__name__)
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,215 @@
+import math
+import random
+import threading
+import time
+from config import (
+    CRYPTOCURRENCIES_TO_FETCH,
+    COINGECKO_RATE_LIMIT,
+    COINGECKO_MARKETS_PAGE_SIZE,
+    ETL_INTERVAL,
+    ETL_TIERS,
+    ETL_SCHEDULE_JITTER,
+    ETL_SCHEDULE_BATCH_SIZE,
+)
+from metrics import ETL_SCHEDULE_LAG_SECONDS, ETL_SCHEDULE_MISSED
+
+# Parse ETL_TIERS ("bitcoin,ethereum:30;usd-coin,solana:900") into (name, coins, interval) tuples
+def parse_tiers(spec=ETL_TIERS, crypto_ids=CRYPTOCURRENCIES_TO_FETCH, default_interval=ETL_INTERVAL):
+    tiers = []
+    assigned = set()
+    for index, part in enumerate(filter(None, (part.strip() for part in spec.split(";")))):
+        coins, separator, interval = part.rpartition(":")
+        if not separator:
+            raise ValueError(f"Invalid ETL tier '{part}', expected 'coin,coin:seconds'")
+        coins = [coin.strip() for coin in coins.split(",") if coin.strip() and coin.strip() not in assigned]
+        assigned.update(coins)
+        if coins:
+            tiers.append((f"tier{index + 1}", coins, float(interval)))
+
+    # Every tracked coin is refreshed, at the default cadence unless a tier says otherwise
+    rest = [coin for coin in crypto_ids if coin not in assigned]
+    if rest:
+        tiers.append(("default", rest, default_interval))
+    return tiers
+
+class ScheduledBatch:
+    """A slice of a tier refreshed together, with its own slot in the tier's interval."""
+
+    def __init__(self, tier: str, coins: list, interval: float, first_slot: float, jitter: float):
+        self.tier = tier
+        self.coins = coins
+        self.interval = interval
+        self.jitter = jitter
+        self.slot = first_slot  # Ideal start time; advancing it by whole intervals keeps the cadence from drifting
+        self.next_due = first_slot
+        self.runs = 0
+        self.missed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_duration = 0.0
+
+    def record_start(self, now: float):
+        self.last_lag = max(0.0, now - self.next_due)
+        self.max_lag = max(self.max_lag, self.last_lag)
+        ETL_SCHEDULE_LAG_SECONDS.observe(self.last_lag, tier=self.tier)
+
+    def advance(self, finished_at: float, duration: float):
+        self.runs += 1
+        self.last_duration = duration
+        self.slot += self.interval
+        # Slots that passed while the run was still going are skipped rather than queued up
+        if self.slot <= finished_at:
+            skipped = math.floor((finished_at - self.slot) / self.interval) + 1
+            self.slot += skipped * self.interval
+            self.missed += skipped
+            ETL_SCHEDULE_MISSED.inc(skipped, tier=self.tier)
+        self.next_due = self.slot + random.uniform(0, self.jitter * self.interval)
+
+class EtlScheduler:
+    """
+    Runs the ETL for each tier at its own cadence. Runs are executed one at a time, so a cycle never starts
+    while another is still running; batches that fall due together are merged into a single run. `tiers` is a
+    list of (name, coins, interval) tuples, or a function returning one that is re-read before each run. With a
+    `publisher` (a LoadPublisher the runs hand their loads to), the loads are published between runs once its
+    minimum interval has passed, and once more on exit.
+    """
+
+    def __init__(self, run, tiers=None, batch_size=ETL_SCHEDULE_BATCH_SIZE, jitter=ETL_SCHEDULE_JITTER, clock=time.monotonic,
+                 publisher=None):
+        self.run = run
+        self.clock = clock
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        if tiers is None:
+            tiers = parse_tiers()
+        self.tier_source = tiers if callable(tiers) else (lambda: tiers)
+        self.tiers = None
+        self.batches = []
+        self.refresh_tiers()
+
+    def refresh_tiers(self):
+        """
+        Re-reads the tiers (e.g. after the coin universe changed) and rebuilds the batches if they differ. A batch
+        that still exists at the same position of its tier keeps its slot and counters, with the new coins.
+        """
+        try:
+            tiers = self.tier_source()
+        except Exception as e:
+            print(f"Error reading the ETL tiers, keeping the current schedule: {str(e)}")
+            return False
+        if tiers == self.tiers:
+            return False
+
+        previous = {}
+        for batch in self.batches:
+            previous.setdefault(batch.tier, []).append(batch)
+
+        # Split large tiers into batches staggered across the interval, so the requests are spread over time
+        start = self.clock()
+        batches = []
+        for tier, coins, interval in tiers:
+            n_batches = math.ceil(len(coins) / self.batch_size)
+            for index in range(n_batches):
+                batch_coins = coins[index * self.batch_size:(index + 1) * self.batch_size]
+                existing = previous.get(tier, [])
+                if index < len(existing) and existing[index].interval == interval:
+                    existing[index].coins = batch_coins
+                    batches.append(existing[index])
+                else:
+                    batches.append(ScheduledBatch(tier, batch_coins, interval, start + index * interval / n_batches, self.jitter))
+        if self.tiers is not None:
+            print(f"ETL schedule updated: {sum(len(coins) for _, coins, _ in tiers)} coins in {len(batches)} batches")
+        self.tiers = tiers
+        self.batches = batches
+        return True
+
+    def requests_per_minute(self):
+        """Estimates the CoinGecko requests per minute of the schedule (one /coins/markets page plus one chart per coin)."""
+        return sum(
+            (math.ceil(len(batch.coins) / COINGECKO_MARKETS_PAGE_SIZE) + len(batch.coins)) * 60 / batch.interval
+            for batch in self.batches
+        )
+
+    def run_due(self):
+        """Runs every batch that is due in a single ETL call and returns the number of batches run."""
+        if not self.lock.acquire(blocking=False):
+            return 0  # A run is already in progress
+        try:
+            self.refresh_tiers()
+            now = self.clock()
+            due = [batch for batch in self.batches if batch.next_due <= now]
+            if not due:
+                return 0
+            for batch in due:
+                batch.record_start(now)
+
+            crypto_ids = list(dict.fromkeys(coin for batch in due for coin in batch.coins))
+            try:
+                self.run(crypto_ids)
+            except Exception as e:
+                print(f"Error in scheduled ETL run for {', '.join(sorted({batch.tier for batch in due}))}: {str(e)}")
+
+            finished_at = self.clock()
+            for batch in due:
+                batch.advance(finished_at, finished_at - now)
+            return len(due)
+        finally:
+            self.lock.release()
+
+    def publish_due(self, force: bool = False):
+        """Publishes the loads handed to the publisher if they are due (or `force`)."""
+        if self.publisher is None:
+            return
+        try:
+            self.publisher.publish_due(force=force)
+        except Exception as e:
+            print(f"Error publishing the scheduled ETL loads: {str(e)}")
+
+    def next_wakeup(self):
+        """Returns the clock time of the next batch or pending publication."""
+        # Without batches (the coin universe is empty for now), check the tiers again after the default interval
+        next_due = min((batch.next_due for batch in self.batches), default=self.clock() + ETL_INTERVAL)
+        publish_due = self.publisher.next_due() if self.publisher is not None else None
+        return min(next_due, publish_due) if publish_due is not None else next_due
+
+    def run_forever(self):
+        """Runs the schedule until stop() is called, sleeping until the next batch or publication is due."""
+        # An empty schedule (e.g. the coin universe could not be read yet) is re-read before each wakeup
+        if not self.batches:
+            print("ETL schedule is empty for now; waiting for the tiers to list coins")
+
+        budget = self.requests_per_minute()
+        print(f"ETL schedule: {len(self.batches)} batches, about {budget:.1f} CoinGecko requests per minute")
+        if budget > COINGECKO_RATE_LIMIT:
+            print(f"Warning: the schedule needs more than COINGECKO_RATE_LIMIT ({COINGECKO_RATE_LIMIT:g}/min); runs will lag")
+
+        try:
+            while not self.stop_event.is_set():
+                self.run_due()
+                self.publish_due()
+                self.stop_event.wait(max(0.0, self.next_wakeup() - self.clock()))
+        finally:
+            # Do not leave loaded data unpublished
+            self.publish_due(force=True)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        """Returns per-tier run counts, lag and missed slots."""
+        tiers = {}
+        for batch in self.batches:
+            tier = tiers.setdefault(batch.tier, {
+                "interval": batch.interval, "coins": 0, "runs": 0, "missed": 0,
+                "last_lag": 0.0, "max_lag": 0.0, "last_duration": 0.0,
+            })
+            tier["coins"] += len(batch.coins)
+            tier["runs"] += batch.runs
+            tier["missed"] += batch.missed
+            tier["last_lag"] = max(tier["last_lag"], batch.last_lag)
+            tier["max_lag"] = max(tier["max_lag"], batch.max_lag)
+            tier["last_duration"] = max(tier["last_duration"], batch.last_duration)
+        return tiers
@@ -0,0 +1,185 @@
+import fcntl
+import json
+import math
+import os
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from config import ETL_SHARDS, ETL_LEASE_TTL, ETL_WORKER_ID, ETL_INTERVAL, ETL_ANALYTICS_SNAPSHOTS, ETL_ROUND_FILE
+from repositories.factory import get_repository
+from etl.coingecko_etl import publish_load
+from etl.universe import CoinUniverse
+
+# Stable shard of a coin: every worker and node computes the same assignment
+def shard_of(coingecko_id: str, n_shards: int = ETL_SHARDS) -> int:
+    return zlib.crc32(coingecko_id.encode()) % n_shards
+
+def default_worker_id():
+    return ETL_WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+# Lease names: one per shard, plus one per worker so every worker can count the live ones
+def shard_lease(shard: int) -> str:
+    return f"shard:{shard}"
+
+def worker_lease(worker_id: str) -> str:
+    return f"worker:{worker_id}"
+
+class ShardRound:
+    """
+    The shards refreshed since the workers of a node last published their loads, in a file they all update under
+    a lock. A round is complete once every shard holding tracked coins has been refreshed.
+    """
+
+    def __init__(self, path: str = ETL_ROUND_FILE):
+        self.path = path
+
+    def complete(self, shards, expected, timeout: float, now: float = None) -> bool:
+        """
+        Records `shards` as refreshed. Returns True, and starts a new round, if every shard in `expected` has been
+        refreshed since the round started, or if the round is older than `timeout` seconds (a shard kept failing).
+        """
+        now = time.time() if now is None else now
+        with open(os.open(self.path, os.O_RDWR | os.O_CREAT), "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                started_at = state.get("started_at", now)
+                refreshed = set(state.get("shards", [])) | set(shards)
+                complete = set(expected) <= refreshed or now - started_at >= timeout
+                if complete:
+                    started_at, refreshed = now, set()
+                f.seek(0)
+                f.truncate()
+                json.dump({"started_at": started_at, "shards": sorted(refreshed)}, f)
+            finally:
+                f.flush()
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return complete
+
+class ShardWorker:
+    """
+    One ETL worker of a sharded deployment. Shards are owned through leases stored in the database:
+    a worker only refreshes the coins of the shards it holds, takes up to its fair share of the free or
+    expired shards, and hands back the surplus when other workers join. A worker that dies stops renewing
+    its leases, so its shards are picked up by the others once they expire. Loads are published once per round:
+    by the worker whose cycle leaves no shard with tracked coins unrefreshed.
+    """
+
+    def __init__(self, worker_id=None, n_shards=ETL_SHARDS, lease_ttl=ETL_LEASE_TTL, universe=None, repository=None, shard_round=None):
+        self.worker_id = worker_id or default_worker_id()
+        self.n_shards = n_shards
+        self.lease_ttl = lease_ttl
+        self.universe = universe or CoinUniverse()
+        self.repository = repository or get_repository()
+        self.shard_round = shard_round or ShardRound()
+        self.shards = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def rebalance(self):
+        """Renews the held leases, gives back shards above the fair share and claims free ones up to it."""
+        self.repository.acquire_lease(worker_lease(self.worker_id), self.worker_id, self.lease_ttl)
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        live = [lease for lease in self.repository.get_leases() if lease["expires_at"] > now]
+        workers = {lease["owner"] for lease in live if lease["name"].startswith("worker:")} | {self.worker_id}
+        live = {
+            int(lease["name"].split(":", 1)[1]): lease["owner"]
+            for lease in live if lease["name"].startswith("shard:")
+        }
+        fair_share = math.ceil(self.n_shards / len(workers))
+
+        held = sorted(shard for shard, owner in live.items() if owner == self.worker_id and shard < self.n_shards)
+        for shard in held[fair_share:]:
+            self.repository.release_lease(shard_lease(shard), self.worker_id)
+        held = [
+            shard for shard in held[:fair_share]
+            if self.repository.acquire_lease(shard_lease(shard), self.worker_id, self.lease_ttl)
+        ]
+
+        # Start looking at a worker-specific offset so concurrent workers rarely race for the same shard
+        offset = zlib.crc32(self.worker_id.encode()) % self.n_shards
+        for step in range(self.n_shards):
+            if len(held) >= fair_share:
+                break
+            shard = (offset + step) % self.n_shards
+            if shard not in live and self.repository.acquire_lease(shard_lease(shard), self.worker_id, self.lease_ttl):
+                held.append(shard)
+
+        with self.lock:
+            if set(held) != self.shards:
+                print(f"Worker {self.worker_id} owns shards {sorted(held)} ({len(workers)} active workers)")
+            self.shards = set(held)
+        return self.shards
+
+    def renew_leases(self):
+        """Extends the held leases; a shard whose lease was lost is dropped."""
+        self.repository.acquire_lease(worker_lease(self.worker_id), self.worker_id, self.lease_ttl)
+        with self.lock:
+            shards = list(self.shards)
+        lost = [
+            shard for shard in shards
+            if not self.repository.acquire_lease(shard_lease(shard), self.worker_id, self.lease_ttl)
+        ]
+        if lost:
+            print(f"Worker {self.worker_id} lost the leases of shards {lost}")
+            with self.lock:
+                self.shards.difference_update(lost)
+
+    def owned_coins(self):
+        """Returns the coins of the universe that belong to the shards held by this worker."""
+        with self.lock:
+            shards = set(self.shards)
+        return [coin for coin in self.universe.get() if shard_of(coin, self.n_shards) in shards]
+
+    def complete_round(self, shards, timeout: float) -> bool:
+        """Records the shards this worker refreshed; returns True if that completes the round."""
+        expected = {shard_of(coin, self.n_shards) for coin in self.universe.get()}
+        return self.shard_round.complete(shards, expected, timeout)
+
+    def heartbeat(self):
+        # Renew well before expiry, so leases survive cycles longer than the TTL
+        while not self.stop_event.wait(self.lease_ttl / 3):
+            try:
+                self.renew_leases()
+            except Exception as e:
+                print(f"Error renewing leases for worker {self.worker_id}: {str(e)}")
+
+    def run_forever(self, run, interval=ETL_INTERVAL, publish=publish_load):
+        """
+        Refreshes the owned coins every `interval` seconds until stop() is called, releasing the leases on exit.
+        `run(coins, publish=False)` loads the coins and returns their history rows (None on failure); `publish`
+        publishes the loads of every worker once the round is complete.
+        """
+        # Shards move to another worker once their lease expires, which refreshes them within one more interval
+        round_timeout = self.lease_ttl + 2 * interval
+        threading.Thread(target=self.heartbeat, daemon=True).start()
+        try:
+            while not self.stop_event.is_set():
+                started = time.monotonic()
+                try:
+                    self.rebalance()
+                    coins = self.owned_coins()
+                    refreshed = {shard_of(coin, self.n_shards) for coin in coins}
+                    if coins and run(coins, publish=False) is not None and self.complete_round(refreshed, round_timeout):
+                        # The other workers' rows are not in this process, so the price snapshot is exported in full
+                        publish(analytics_snapshots=ETL_ANALYTICS_SNAPSHOTS)
+                except Exception as e:
+                    print(f"Error in ETL worker {self.worker_id}: {str(e)}")
+                self.stop_event.wait(max(0.0, interval - (time.monotonic() - started)))
+        finally:
+            self.stop()
+            # Hand the shards over right away instead of waiting for the leases to expire
+            for name in [shard_lease(shard) for shard in self.shards] + [worker_lease(self.worker_id)]:
+                try:
+                    self.repository.release_lease(name, self.worker_id)
+                except Exception as e:
+                    print(f"Error releasing the '{name}' lease: {str(e)}")
+
+    def stop(self):
+        self.stop_event.set()
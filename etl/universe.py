@@ -0,0 +1,40 @@
+import threading
+import time
+from config import CRYPTOCURRENCIES_TO_FETCH, ETL_UNIVERSE_SIZE, ETL_UNIVERSE_REFRESH, ETL_UNIVERSE_RETRY
+from etl.coingecko_etl import fetch_top_market_data
+
+class CoinUniverse:
+    """
+    The coins the ETL tracks: CRYPTOCURRENCIES_TO_FETCH, or the top `size` coins by market cap
+    re-read from /coins/markets every `refresh_interval` seconds. A failed refresh is retried after
+    `retry_interval` seconds, not on every call.
+    """
+
+    def __init__(self, size: int = ETL_UNIVERSE_SIZE, refresh_interval: float = ETL_UNIVERSE_REFRESH, static=CRYPTOCURRENCIES_TO_FETCH,
+                 retry_interval: float = ETL_UNIVERSE_RETRY):
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.static = list(static)
+        self.coins = None
+        self.next_refresh = None  # Clock time of the next refresh attempt
+        self.lock = threading.Lock()
+
+    def get(self) -> list[str]:
+        """Returns the current coin list, refreshing it when it is older than the refresh interval."""
+        if not self.size:
+            return list(self.static)
+
+        with self.lock:
+            now = time.monotonic()
+            if self.next_refresh is None or now >= self.next_refresh:
+                try:
+                    rows = fetch_top_market_data(self.size)
+                    self.coins = list(dict.fromkeys(row["id"] for row in rows if row.get("current_price") is not None))
+                    self.next_refresh = now + self.refresh_interval
+                    print(f"Coin universe refreshed: top {len(self.coins)} coins by market cap")
+                except Exception as e:
+                    # Keep the previous list (or the static one), and wait before calling CoinGecko again
+                    self.next_refresh = now + min(self.retry_interval, self.refresh_interval)
+                    print(f"Error refreshing the coin universe, retrying in {self.next_refresh - now:g} s: {str(e)}")
+            return list(self.coins) if self.coins is not None else list(self.static)
@@ -1,16 +1,97 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
 from config import PORT, HOST
 from router.router import router as crypto_router
 from etl.coingecko_etl import run_etl
 from config import CRYPTOCURRENCIES_TO_FETCH
+from repositories.factory import get_repository
+from metrics import REGISTRY, HTTP_REQUEST_SECONDS
+from router.price_stream import get_price_broadcaster
+from router.responses import FastJSONResponse, CompressionMiddleware, data_etag, etag_matches
 
 # Create the FastAPI instance with the title and server configuration
-app = FastAPI(title="Cryptocurrency API", host=HOST, port=PORT)
+app = FastAPI(title="Cryptocurrency API", host=HOST, port=PORT, default_response_class=FastJSONResponse)
 
 # Include the endpoints from the `crypto_router` in the main application
 app.include_router(crypto_router)
 
+# Tag /crypto responses with the data version and answer a matching If-None-Match with 304 before running the route.
+# The tag is read before the route runs, so a response may hold newer data than its tag but never older
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    path = request.url.path
+    etag = None
+    if request.method == "GET" and path.startswith("/crypto") and not path.startswith("/crypto/stream/"):
+        etag = data_etag(path, request.url.query)
+    if etag and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    response = await call_next(request)
+    if etag and response.status_code == 200:
+        response.headers["ETag"] = etag
+        response.headers.setdefault("Cache-Control", "no-cache")
+    return response
+
+# Record the latency of every request, labelled by route template (e.g. /crypto/{symbol}) rather than raw path
+@app.middleware("http")
+async def track_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status)
+        )
+
+# Export the repository cache counters alongside the other metrics
+def repository_cache_metrics():
+    stats = get_repository().cache_stats()
+    if not stats:
+        return []
+    lines = []
+    for name, kind, help_text, value in (
+        ("repository_cache_hits_total", "counter", "Repository cache hits.", stats["hits"]),
+        ("repository_cache_misses_total", "counter", "Repository cache misses.", stats["misses"]),
+        ("repository_cache_entries", "gauge", "Entries held in the repository cache.", stats["entries"]),
+        ("repository_cache_generation", "gauge", "Data generation the cache entries belong to.", stats["generation"] or 0),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return lines
+
+REGISTRY.add_collector(repository_cache_metrics)
+
+# Export the number of clients connected to the live price stream of this worker
+def price_stream_metrics():
+    return [
+        "# HELP price_stream_subscribers Clients connected to the live price stream.",
+        "# TYPE price_stream_subscribers gauge",
+        f"price_stream_subscribers {get_price_broadcaster().stats()['subscribers']}",
+    ]
+
+REGISTRY.add_collector(price_stream_metrics)
+
+# Compress large responses; added last so it wraps every other middleware
+app.add_middleware(CompressionMiddleware)
+
 # Define a root endpoint (`/`) that returns a welcome message
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Cryptocurrency Analytics Project! - By Pipe199x"}
+
+# Define an endpoint that exposes the hit/miss counters of the repository cache
+@app.get("/cache/stats")
+async def cache_stats():
+    return get_repository().cache_stats()
+
+# Define an endpoint that exposes the metrics in the Prometheus text format
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,192 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default latency buckets in seconds, from sub-millisecond database reads up to slow ETL stages
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic counter with optional labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, [("le", bound)])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class Registry:
+    """Collection of metrics exposed together on /metrics."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []  # Callables returning extra exposition lines (e.g. cache gauges)
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# ETL
+ETL_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "etl_stage_duration_seconds", "Duration of each ETL stage per cycle.", ["stage"]
+))
+ETL_COIN_SECONDS = REGISTRY.register(Histogram(
+    "etl_coin_extract_duration_seconds", "Time spent extracting the data of one coin."
+))
+ETL_CYCLES = REGISTRY.register(Counter(
+    "etl_cycles_total", "ETL cycles by outcome.", ["status"]
+))
+ETL_COIN_FAILURES = REGISTRY.register(Counter(
+    "etl_coin_failures_total", "Coins that could not be extracted or transformed.", ["stage"]
+))
+ETL_SCHEDULE_LAG_SECONDS = REGISTRY.register(Histogram(
+    "etl_schedule_lag_seconds", "Delay between a scheduled refresh and its start.", ["tier"]
+))
+ETL_SCHEDULE_MISSED = REGISTRY.register(Counter(
+    "etl_schedule_missed_total", "Scheduled refreshes skipped because the previous run overran.", ["tier"]
+))
+
+# Upstream CoinGecko calls
+UPSTREAM_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "coingecko_request_duration_seconds", "Latency of CoinGecko HTTP requests.", ["endpoint", "status"]
+))
+UPSTREAM_RETRIES = REGISTRY.register(Counter(
+    "coingecko_retries_total", "CoinGecko requests retried, by reason.", ["endpoint", "reason"]
+))
+UPSTREAM_CACHE = REGISTRY.register(Counter(
+    "coingecko_cache_total", "CoinGecko response cache lookups, by result.", ["endpoint", "result"]
+))
+
+# Database
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "repository_query_duration_seconds", "Latency of database round-trips per repository method.", ["backend", "method"]
+))
+
+# API
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Latency of API requests per route.", ["method", "route", "status"]
+))
+PRICE_STREAM_EVENTS = REGISTRY.register(Counter(
+    "price_stream_events_total", "Events sent to live price stream clients, by type.", ["event"]
+))
+PRICE_STREAM_CONFLATED = REGISTRY.register(Counter(
+    "price_stream_conflated_total", "Live price updates replaced by a newer one before a slow client read them."
+))
+
+def track_queries(backend: str):
+    """Decorator timing a repository method as one database round-trip."""
+    def decorator(func):
+        method = func.__name__.lstrip("_")
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with DB_QUERY_SECONDS.time(backend=backend, method=method):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Serve /metrics from a background thread, for processes without the API (e.g. run_etl.py)
+def start_http_server(port: int, host: str = "0.0.0.0"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,139 @@
+import asyncio
+from models.cryptocurrency import Cryptocurrency, HistoricalPrice
+from database import get_async_db
+from datetime import datetime, timedelta
+from repositories.crypto_repository import CryptoRepository
+from config import HISTORY_PAGE_SIZE
+from metrics import DB_QUERY_SECONDS
+
+class AsyncCryptoRepository:
+    """Non-blocking counterpart of CryptoRepository for the read paths served by async endpoints."""
+
+    # Share the read-through cache with the sync repository so both paths see the same entries
+    _cache = CryptoRepository._cache
+
+    async def _db(self):
+        return await get_async_db()
+
+    @staticmethod
+    async def _execute(method: str, query):
+        # Each PostgREST request is one database round-trip, timed per repository method
+        with DB_QUERY_SECONDS.time(backend="supabase", method=method):
+            return await query.execute()
+
+    async def get_all_cryptocurrencies(self):
+        """Fetches all cryptocurrencies from the database."""
+        async def load():
+            db = await self._db()
+            response = await self._execute("get_all_cryptocurrencies", db.table('cryptocurrencies').select('*'))
+            return [Cryptocurrency(**crypto) for crypto in response.data] if response.data else []
+
+        try:
+            return await self._cache.get_or_load_async(("get_all_cryptocurrencies",), load)
+        except Exception as e:
+            print(f"Error fetching all cryptocurrencies: {e}")
+            return []
+
+    async def get_cryptocurrency_by_symbol(self, symbol: str):
+        """Fetches a specific cryptocurrency by its symbol."""
+        async def load():
+            db = await self._db()
+            response = await self._execute(
+                "get_cryptocurrency_by_symbol", db.table('cryptocurrencies').select('*').eq('symbol', symbol)
+            )
+            return Cryptocurrency(**response.data[0]) if response.data else None
+
+        try:
+            return await self._cache.get_or_load_async(("get_cryptocurrency_by_symbol", symbol), load)
+        except Exception as e:
+            print(f"Error fetching cryptocurrency by symbol '{symbol}': {e}")
+            return None
+
+    async def _historical_prices_query(self, crypto_id: int, start_date=None, end_date=None, limit=None, before=None):
+        db = await self._db()
+        query = db.table("historical_prices").select("*").eq("crypto_id", crypto_id)
+        if start_date:
+            query = query.gte("date", start_date)
+        if end_date:
+            query = query.lte("date", end_date)
+        # Keyset pagination: continue right after the last date of the previous page
+        if before:
+            query = query.lt("date", before.isoformat())
+        query = query.order("date", desc=True)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    async def get_historical_prices_by_crypto_id(self, crypto_id: int, start_date=None, end_date=None, limit=None, before=None):
+        """
+        Fetches historical prices for a given cryptocurrency ID within a specified date range, newest first.
+        Rows are unique per day in the database, so no de-duplication is needed here.
+        """
+        async def load():
+            query = await self._historical_prices_query(crypto_id, start_date, end_date, limit, before)
+            response = await self._execute("get_historical_prices_by_crypto_id", query)
+            return [HistoricalPrice(**data) for data in response.data]
+
+        return await self._cache.get_or_load_async(
+            ("get_historical_prices_by_crypto_id", crypto_id, start_date, end_date, limit, before), load
+        )
+
+    async def iter_historical_prices(self, crypto_id: int, start_date=None, end_date=None, page_size=HISTORY_PAGE_SIZE):
+        """Yields pages of historical prices, newest first, keeping only one page in memory at a time."""
+        before = None
+        while True:
+            query = await self._historical_prices_query(crypto_id, start_date, end_date, page_size, before)
+            response = await self._execute("iter_historical_prices", query)
+            page = [HistoricalPrice(**data) for data in response.data]
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            before = page[-1].date
+
+    async def get_highest_volume_crypto(self):
+        """Fetches the cryptocurrency with the highest trading volume in the last 24 hours."""
+        last_24_hours = datetime.now() - timedelta(hours=24)
+
+        try:
+            db = await self._db()
+            query = await self._execute(
+                "get_highest_volume_crypto",
+                db.table("historical_prices")
+                .select("crypto_id, coingecko_id, total_volume")
+                .gte("date", last_24_hours.isoformat())
+                .order("total_volume", desc=True)
+                .limit(1)
+            )
+            return query.data[0] if query.data else None
+        except Exception as e:
+            print(f"Error fetching highest volume cryptocurrency in the last 24 hours: {e}")
+            return None
+
+class ThreadedAsyncRepository:
+    """Async facade over a sync repository (e.g. SQLite) that runs each call in a worker thread."""
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    async def get_all_cryptocurrencies(self):
+        return await asyncio.to_thread(self.repository.get_all_cryptocurrencies)
+
+    async def get_cryptocurrency_by_symbol(self, symbol: str):
+        return await asyncio.to_thread(self.repository.get_cryptocurrency_by_symbol, symbol)
+
+    async def get_historical_prices_by_crypto_id(self, crypto_id: int, start_date=None, end_date=None, limit=None, before=None):
+        return await asyncio.to_thread(
+            self.repository.get_historical_prices_by_crypto_id, crypto_id, start_date, end_date, limit, before
+        )
+
+    async def iter_historical_prices(self, crypto_id: int, start_date=None, end_date=None, page_size=HISTORY_PAGE_SIZE):
+        pages = self.repository.iter_historical_prices(crypto_id, start_date, end_date, page_size)
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                return
+            yield page
+
+    async def get_highest_volume_crypto(self):
+        return await asyncio.to_thread(self.repository.get_highest_volume_crypto)
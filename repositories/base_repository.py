@@ -0,0 +1,83 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from models.cryptocurrency import Cryptocurrency
+
+class BaseCryptoRepository(ABC):
+    """Storage interface used by the ETL and the use cases; see config.STORAGE_BACKEND."""
+
+    @classmethod
+    def cache_stats(cls):
+        """Returns the hit/miss counters of the read-through cache (empty for backends without one)."""
+        return {}
+
+    @abstractmethod
+    def get_all_cryptocurrencies(self) -> list[Cryptocurrency]:
+        """Fetches all cryptocurrencies."""
+
+    @abstractmethod
+    def get_cryptocurrency_by_symbol(self, symbol: str) -> Cryptocurrency | None:
+        """Fetches a specific cryptocurrency by its symbol."""
+
+    @abstractmethod
+    def upsert_cryptocurrencies(self, cryptos: list[Cryptocurrency]) -> list[dict]:
+        """Inserts or updates many cryptocurrencies at once and returns the stored rows."""
+
+    @abstractmethod
+    def get_latest_historical_date(self, coingecko_id: str) -> datetime | None:
+        """Fetches the date of the most recent historical price stored for a cryptocurrency."""
+
+    @abstractmethod
+    def upsert_historical_prices(self, historical_prices: list[dict]):
+        """Inserts or updates historical price records, one per cryptocurrency and day."""
+
+    @abstractmethod
+    def get_historical_prices_by_crypto_id(self, crypto_id: int, start_date=None, end_date=None, limit=None, before=None):
+        """Fetches historical prices for a cryptocurrency within a date range, newest first."""
+
+    @abstractmethod
+    def iter_historical_prices(self, crypto_id: int, start_date=None, end_date=None, page_size=None):
+        """Yields pages of historical prices, newest first."""
+
+    @abstractmethod
+    def get_price_on_date(self, crypto_id: int, date: datetime) -> float | None:
+        """Fetches the closing price of a cryptocurrency on a specific date."""
+
+    @abstractmethod
+    def get_historical_price_rows(self, crypto_ids: list[int], start_date: datetime = None) -> list[dict]:
+        """Fetches raw historical price rows of many cryptocurrencies, sorted by crypto ID and date."""
+
+    @abstractmethod
+    def get_prices_as_of(self, lookups: list[tuple[int, datetime]], max_staleness_days: int = None) -> dict:
+        """Resolves the latest closing price at or before each (crypto_id, date) pair."""
+
+    @abstractmethod
+    def get_highest_volume_crypto(self) -> dict | None:
+        """Fetches the cryptocurrency with the highest trading volume in the last 24 hours."""
+
+    @abstractmethod
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Takes or renews a named ETL lease (e.g. a shard); fails while another owner holds it unexpired."""
+
+    @abstractmethod
+    def release_lease(self, name: str, owner: str):
+        """Gives up a named ETL lease held by the owner."""
+
+    @abstractmethod
+    def get_leases(self) -> list[dict]:
+        """Fetches every ETL lease, with `expires_at` as a naive UTC datetime."""
+
+    def get_market_dominance(self) -> list[dict]:
+        """Calculates each cryptocurrency's share of the total market cap (in percent)."""
+        all_cryptocurrencies = self.get_all_cryptocurrencies()
+        total_market_cap = sum(crypto.market_cap for crypto in all_cryptocurrencies if crypto.market_cap)
+        if total_market_cap <= 0:
+            return []
+        return [
+            {
+                "crypto_id": crypto.id,
+                "coingecko_id": crypto.coingecko_id,
+                "dominance": (crypto.market_cap / total_market_cap) * 100
+            }
+            for crypto in all_cryptocurrencies
+            if crypto.market_cap
+        ]
@@ -0,0 +1,153 @@
+import fcntl
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from config import ETL_GENERATION_FILE, REPO_CACHE_MAX_ENTRIES, REPO_CACHE_TTL
+
+# The ETL generation is a counter stored in a small file so the ETL process and every API worker agree on it
+_generation_lock = threading.Lock()
+_generation_state = {"stat": None, "value": 0}
+
+def current_generation():
+    """Returns the generation of the last successful ETL load (0 if none was recorded)."""
+    try:
+        stat = os.stat(ETL_GENERATION_FILE)
+    except OSError:
+        return _generation_state["value"]
+
+    # Only read the file again when it changed on disk
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _generation_lock:
+        if signature != _generation_state["stat"]:
+            try:
+                with open(ETL_GENERATION_FILE) as f:
+                    _generation_state["value"] = int(f.read().strip() or 0)
+                _generation_state["stat"] = signature
+            except (OSError, ValueError):
+                pass
+        return _generation_state["value"]
+
+# Serialize read-modify-write updates of the generation file between ETL processes (e.g. sharded workers)
+@contextmanager
+def generation_file_lock():
+    with open(f"{ETL_GENERATION_FILE}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def bump_generation():
+    """Advances the ETL generation after a successful load, invalidating cached reads everywhere."""
+    with generation_file_lock():
+        # Read the file itself: another process may have bumped it within the mtime resolution of current_generation
+        try:
+            with open(ETL_GENERATION_FILE) as f:
+                stored = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            stored = 0
+        with _generation_lock:
+            value = max(_generation_state["value"], stored) + 1
+
+        # Replace the file atomically so readers never see a partial write
+        tmp_path = f"{ETL_GENERATION_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(value))
+        os.replace(tmp_path, ETL_GENERATION_FILE)
+
+    with _generation_lock:
+        _generation_state["value"] = max(_generation_state["value"], value)
+    return value
+
+class QueryCache:
+    """Bounded LRU cache of query results, valid for one ETL generation and at most `ttl` seconds."""
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int = REPO_CACHE_MAX_ENTRIES, ttl: float = REPO_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored_at, value)
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _sync_generation(self):
+        # A new ETL generation makes every cached result obsolete
+        generation = current_generation()
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for `key`, calling `loader()` and caching its result on a miss."""
+        with self.lock:
+            self._sync_generation()
+            value = self._get(key)
+            if value is not self._MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self.generation
+
+        value = loader()
+
+        with self.lock:
+            # Do not store results loaded while a new generation was being published
+            if generation == self.generation:
+                self._put(key, value)
+        return value
+
+    async def get_or_load_async(self, key, loader):
+        """Async variant of `get_or_load`, where `loader()` returns an awaitable."""
+        with self.lock:
+            self._sync_generation()
+            value = self._get(key)
+            if value is not self._MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self.generation
+
+        value = await loader()
+
+        with self.lock:
+            if generation == self.generation:
+                self._put(key, value)
+        return value
+
+    def _put(self, key, value):
+        self.entries[key] = (time.monotonic(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return self._MISSING
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self.entries[key]
+            return self._MISSING
+        self.entries.move_to_end(key)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "generation": self.generation,
+            }
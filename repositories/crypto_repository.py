@@ -1,39 +1,66 @@
+from bisect import bisect_right
 from models.cryptocurrency import Cryptocurrency, HistoricalPrice
 from database import get_db
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from config import AS_OF_MAX_STALENESS_DAYS, AS_OF_LOOKUPS_PER_REQUEST, HISTORY_PAGE_SIZE
+from repositories.cache import QueryCache
+from repositories.base_repository import BaseCryptoRepository
+from metrics import DB_QUERY_SECONDS
+
+class CryptoRepository(BaseCryptoRepository):
+    # Read-through cache shared by every repository instance; invalidated when the ETL publishes a new generation
+    _cache = QueryCache()
 
-class CryptoRepository:
     def __init__(self):
         # Initialize the database connection
         self.supabase = get_db()
         print('Database connection established.')
 
+    @classmethod
+    def cache_stats(cls):
+        """Returns the hit/miss counters of the read-through cache."""
+        return cls._cache.stats()
+
+    @staticmethod
+    def _execute(method: str, query):
+        # Each PostgREST request is one database round-trip, timed per repository method
+        with DB_QUERY_SECONDS.time(backend="supabase", method=method):
+            return query.execute()
+
     def get_all_cryptocurrencies(self):
         """Fetches all cryptocurrencies from the database."""
-        try:
+        def load():
             # Retrieve all records from the 'cryptocurrencies' table
-            response = self.supabase.table('cryptocurrencies').select('*').execute()
+            response = self._execute("get_all_cryptocurrencies", self.supabase.table('cryptocurrencies').select('*'))
             # Return the list of cryptocurrencies as instances of the Cryptocurrency model
             return [Cryptocurrency(**crypto) for crypto in response.data] if response.data else []
+
+        try:
+            return self._cache.get_or_load(("get_all_cryptocurrencies",), load)
         except Exception as e:
             print(f"Error fetching all cryptocurrencies: {e}")
             return []
 
     def get_cryptocurrency_by_symbol(self, symbol: str):
         """Fetches a specific cryptocurrency by its symbol."""
-        try:
+        def load():
             # Query for a cryptocurrency record by symbol
-            response = self.supabase.table('cryptocurrencies').select('*').eq('symbol', symbol).execute()
+            response = self._execute(
+                "get_cryptocurrency_by_symbol", self.supabase.table('cryptocurrencies').select('*').eq('symbol', symbol)
+            )
             # Return the cryptocurrency if found, otherwise return None
             return Cryptocurrency(**response.data[0]) if response.data else None
+
+        try:
+            return self._cache.get_or_load(("get_cryptocurrency_by_symbol", symbol), load)
         except Exception as e:
             print(f"Error fetching cryptocurrency by symbol '{symbol}': {e}")
             return None
 
-    def upsert_cryptocurrency(self, crypto: Cryptocurrency):
-        """Inserts or updates a cryptocurrency record in the database."""
-        # Prepare cryptocurrency data for insertion/updating
-        crypto_data = {
+    @staticmethod
+    def _to_record(crypto: Cryptocurrency):
+        """Prepares cryptocurrency data for insertion/updating."""
+        return {
             "coingecko_id": crypto.coingecko_id,
             "symbol": crypto.symbol,
             "name": crypto.name,
@@ -42,19 +69,63 @@ class CryptoRepository:
             "total_volume": crypto.total_volume,
             "last_updated": crypto.last_updated.isoformat()
         }
+
+    def upsert_cryptocurrency(self, crypto: Cryptocurrency):
+        """Inserts or updates a cryptocurrency record in the database."""
+        crypto_data = self._to_record(crypto)
         try:
             # Use upsert to insert or update based on the 'coingecko_id' field
-            response = self.supabase.table("cryptocurrencies").upsert(crypto_data, on_conflict=["coingecko_id"]).execute()
+            response = self._execute(
+                "upsert_cryptocurrency",
+                self.supabase.table("cryptocurrencies").upsert(crypto_data, on_conflict=["coingecko_id"])
+            )
             return response
         except Exception as e:
             print(f"Error upserting cryptocurrency '{crypto.symbol}': {e}")
             return None
 
-    def get_historical_prices_by_crypto_id(self, crypto_id: int, start_date=None, end_date=None):
-        """
-        Fetches historical prices for a given cryptocurrency ID within a specified date range,
-        ensuring only unique entries by day.
-        """
+    def upsert_cryptocurrencies(self, cryptos: list[Cryptocurrency]):
+        """Inserts or updates many cryptocurrency records in a single request and returns the stored rows."""
+        # A multi-row upsert cannot touch the same row twice, so keep one record per coingecko_id
+        records = {crypto.coingecko_id: self._to_record(crypto) for crypto in cryptos}
+        if not records:
+            return []
+        response = self._execute(
+            "upsert_cryptocurrencies",
+            self.supabase
+            .table("cryptocurrencies")
+            .upsert(list(records.values()), on_conflict="coingecko_id")
+        )
+        return response.data
+
+    def get_latest_historical_date(self, coingecko_id: str):
+        """Fetches the date of the most recent historical price stored for a cryptocurrency."""
+        try:
+            query = self._execute(
+                "get_latest_historical_date",
+                self.supabase
+                .table("historical_prices")
+                .select("date")
+                .eq("coingecko_id", coingecko_id)
+                .order("date", desc=True)
+                .limit(1)
+            )
+            return datetime.fromisoformat(query.data[0]['date']) if query.data else None
+        except Exception as e:
+            print(f"Error fetching latest historical date for '{coingecko_id}': {e}")
+            return None
+
+    def upsert_historical_prices(self, historical_prices: list[dict]):
+        """Inserts or updates historical price records, one per cryptocurrency and day."""
+        # Rows are unique on (crypto_id, date), so re-running the ETL never duplicates them
+        return self._execute(
+            "upsert_historical_prices",
+            self.supabase
+            .table("historical_prices")
+            .upsert(historical_prices, on_conflict="crypto_id,date")
+        )
+
+    def _historical_prices_query(self, crypto_id: int, start_date=None, end_date=None, limit=None, before=None):
         # Start with the base query, filtering by 'crypto_id'
         query = (
             self.supabase
@@ -67,20 +138,48 @@ class CryptoRepository:
             query = query.gte("date", start_date)
         if end_date:
             query = query.lte("date", end_date)
-        
+        # Keyset pagination: continue right after the last date of the previous page
+        if before:
+            query = query.lt("date", before.isoformat())
+
         # Sort results in descending order by date
         query = query.order("date", desc=True)
-        response = query.execute()
-        
-        # Filter to keep only unique entries per day
-        unique_data = {}
-        for entry in response.data:
-            date_key = entry['date'][:10]  # Only use year-month-day for uniqueness
-            if date_key not in unique_data:
-                unique_data[date_key] = entry
-
-        # Convert each entry to an instance of HistoricalPrice
-        return [HistoricalPrice(**data) for data in unique_data.values()]
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    def get_historical_prices_by_crypto_id(self, crypto_id: int, start_date=None, end_date=None, limit=None, before=None):
+        """
+        Fetches historical prices for a given cryptocurrency ID within a specified date range, newest first.
+        Rows are unique per day in the database (unique on crypto_id and date), so no de-duplication is needed here.
+        Pass `limit` and the date of the last row received as `before` to page through long ranges.
+        """
+        def load():
+            response = self._execute(
+                "get_historical_prices_by_crypto_id",
+                self._historical_prices_query(crypto_id, start_date, end_date, limit, before)
+            )
+            # Convert each entry to an instance of HistoricalPrice
+            return [HistoricalPrice(**data) for data in response.data]
+
+        return self._cache.get_or_load(
+            ("get_historical_prices_by_crypto_id", crypto_id, start_date, end_date, limit, before), load
+        )
+
+    def iter_historical_prices(self, crypto_id: int, start_date=None, end_date=None, page_size=HISTORY_PAGE_SIZE):
+        """Yields pages of historical prices, newest first, keeping only one page in memory at a time."""
+        before = None
+        while True:
+            response = self._execute(
+                "iter_historical_prices",
+                self._historical_prices_query(crypto_id, start_date, end_date, page_size, before)
+            )
+            page = [HistoricalPrice(**data) for data in response.data]
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            before = page[-1].date
 
     def get_price_on_date(self, crypto_id: int, date: datetime):
         """Fetches the closing price of a cryptocurrency on a specific date."""
@@ -88,23 +187,112 @@ class CryptoRepository:
         start_of_day = datetime(date.year, date.month, date.day, 0, 0, 0)
         end_of_day = datetime(date.year, date.month, date.day, 23, 59, 59)
 
-        try:
+        def load():
             # Query for the closing price within the specified day range
-            query = (
+            query = self._execute(
+                "get_price_on_date",
                 self.supabase
                 .table("historical_prices")
                 .select("close_price")
                 .eq("crypto_id", crypto_id)
                 .gte("date", start_of_day.isoformat())
                 .lte("date", end_of_day.isoformat())
-                .execute()
             )
             # Return the closing price if data is available, otherwise return None
             return query.data[0]['close_price'] if query.data else None
+
+        try:
+            # Cache by day, since every timestamp within the same day resolves to the same row
+            return self._cache.get_or_load(("get_price_on_date", crypto_id, start_of_day), load)
         except Exception as e:
             print(f"Error fetching price on date '{date}' for crypto ID '{crypto_id}': {e}")
             return None
 
+    def get_historical_price_rows(self, crypto_ids: list[int], start_date: datetime = None, page_size=1000):
+        """
+        Fetches the raw historical price rows of many cryptocurrencies in bulk, sorted by crypto ID and date.
+        Rows are returned as plain dicts so callers can build columnar arrays without per-row models.
+        """
+        rows = []
+        offset = 0
+        while True:
+            query = (
+                self.supabase
+                .table("historical_prices")
+                .select("crypto_id, date, close_price, total_volume, market_cap")
+                .in_("crypto_id", crypto_ids)
+            )
+            # Optionally skip everything before the start date
+            if start_date:
+                query = query.gte("date", start_date.isoformat())
+
+            # Page through the result, since the API caps the number of rows per response
+            response = self._execute(
+                "get_historical_price_rows",
+                query
+                .order("crypto_id")
+                .order("date")
+                .range(offset, offset + page_size - 1)
+            )
+            rows.extend(response.data)
+            if len(response.data) < page_size:
+                return rows
+            offset += page_size
+
+    def get_prices_as_of(self, lookups: list[tuple[int, datetime]], max_staleness_days: int = AS_OF_MAX_STALENESS_DAYS, page_size=1000,
+                         batch_size=AS_OF_LOOKUPS_PER_REQUEST):
+        """
+        Resolves the latest closing price at or before each (crypto_id, date) pair with one query per `batch_size`
+        pairs. Prices older than `max_staleness_days` before the requested date are not considered.
+        """
+        lookups = list(dict.fromkeys(lookups))
+        if not lookups:
+            return {}
+
+        # One bounded date window per pair, combined into an OR filter; batches keep the URL within proxy limits
+        found = {}
+        for batch_start in range(0, len(lookups), batch_size):
+            clauses = ",".join(
+                f'and(crypto_id.eq.{crypto_id},'
+                f'date.gte."{(date - timedelta(days=max_staleness_days)).isoformat(timespec="seconds")}",'
+                f'date.lte."{date.isoformat(timespec="seconds")}")'
+                for crypto_id, date in lookups[batch_start:batch_start + batch_size]
+            )
+            offset = 0
+            while True:
+                response = self._execute(
+                    "get_prices_as_of",
+                    self.supabase
+                    .table("historical_prices")
+                    .select("crypto_id, date, close_price")
+                    .or_(clauses)
+                    .order("crypto_id")
+                    .order("date")
+                    .range(offset, offset + page_size - 1)
+                )
+                # Windows of different batches may overlap, so rows are keyed by coin and date
+                for row in response.data:
+                    found[(row["crypto_id"], datetime.fromisoformat(row["date"][:19]))] = row["close_price"]
+                if len(response.data) < page_size:
+                    break
+                offset += page_size
+
+        # Group the rows per coin in date order, then binary search each requested date
+        dates, prices = {}, {}
+        for (crypto_id, date), close_price in sorted(found.items()):
+            dates.setdefault(crypto_id, []).append(date)
+            prices.setdefault(crypto_id, []).append(close_price)
+
+        # Rows of one coin are shared by all its lookups, so each match must still fall in its own window
+        result = {}
+        for crypto_id, date in lookups:
+            as_of = date.replace(tzinfo=None)
+            coin_dates = dates.get(crypto_id, [])
+            index = bisect_right(coin_dates, as_of) - 1
+            fresh = index >= 0 and coin_dates[index] >= as_of - timedelta(days=max_staleness_days)
+            result[(crypto_id, date)] = prices[crypto_id][index] if fresh else None
+        return result
+
     def get_highest_volume_crypto(self):
         """Fetches the cryptocurrency with the highest trading volume in the last 24 hours."""
         # Define the cutoff time for the last 24 hours
@@ -112,17 +300,56 @@ class CryptoRepository:
 
         try:
             # Query for the cryptocurrency with the highest volume within the last 24 hours
-            query = (
+            query = self._execute(
+                "get_highest_volume_crypto",
                 self.supabase
                 .table("historical_prices")
                 .select("crypto_id, coingecko_id, total_volume")
                 .gte("date", last_24_hours.isoformat())
                 .order("total_volume", desc=True)  # Sort by volume in descending order
                 .limit(1)  # Get only the top result
-                .execute()
             )
             # Return the highest volume cryptocurrency or None if no data
             return query.data[0] if query.data else None
         except Exception as e:
             print(f"Error fetching highest volume cryptocurrency in the last 24 hours: {e}")
             return None
+
+    def acquire_lease(self, name: str, owner: str, ttl: float):
+        """Takes or renews a named ETL lease (e.g. a shard); fails while another owner holds it unexpired."""
+        now = datetime.now(timezone.utc)
+        record = {"name": name, "owner": owner, "expires_at": (now + timedelta(seconds=ttl)).isoformat()}
+
+        # Conditional update: only succeeds when we already own the lease or it has expired
+        response = self._execute(
+            "acquire_lease",
+            self.supabase
+            .table("etl_leases")
+            .update(record)
+            .eq("name", name)
+            .or_(f'owner.eq."{owner}",expires_at.lt."{now.isoformat()}"')
+        )
+        if response.data:
+            return True
+
+        # Nothing was updated: either the lease never existed, or another worker holds it
+        try:
+            response = self._execute("acquire_lease", self.supabase.table("etl_leases").insert(record))
+            return bool(response.data)
+        except Exception:
+            return False  # Another worker inserted the lease first (primary key conflict)
+
+    def release_lease(self, name: str, owner: str):
+        """Gives up a named ETL lease held by the owner."""
+        self._execute(
+            "release_lease",
+            self.supabase.table("etl_leases").delete().eq("name", name).eq("owner", owner)
+        )
+
+    def get_leases(self):
+        """Fetches every ETL lease, with `expires_at` as a naive UTC datetime."""
+        response = self._execute("get_leases", self.supabase.table("etl_leases").select("*").order("name"))
+        return [
+            {**row, "expires_at": datetime.fromisoformat(row["expires_at"][:19])}
+            for row in response.data
+        ]
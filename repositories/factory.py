@@ -0,0 +1,17 @@
+from config import STORAGE_BACKEND
+
+# Function to get a repository for the storage backend selected in config.STORAGE_BACKEND
+def get_repository():
+    if STORAGE_BACKEND == "sqlite":
+        from repositories.sqlite_repository import SQLiteCryptoRepository
+        return SQLiteCryptoRepository()
+    from repositories.crypto_repository import CryptoRepository
+    return CryptoRepository()
+
+# Function to get a non-blocking repository for the selected storage backend
+def get_async_repository():
+    if STORAGE_BACKEND == "sqlite":
+        from repositories.async_crypto_repository import ThreadedAsyncRepository
+        return ThreadedAsyncRepository(get_repository())
+    from repositories.async_crypto_repository import AsyncCryptoRepository
+    return AsyncCryptoRepository()
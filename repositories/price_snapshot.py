@@ -0,0 +1,167 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+from config import PRICE_SNAPSHOT_DIR, PRICE_SNAPSHOT_KEEP
+
+# Columns of historical_prices stored in each version, sorted by crypto ID and timestamp
+COLUMNS = ("crypto_id", "timestamp", "close", "volume", "market_cap")
+
+# Merge new rows into existing columns; a new row replaces the stored one for the same coin and timestamp
+def merge_price_columns(previous, new):
+    if previous is None:
+        return new
+    if new is None:
+        return previous
+    merged = [np.concatenate([old, added]) for old, added in zip(previous, new)]
+    source = np.concatenate([np.zeros(len(previous[0]), dtype=np.int8), np.ones(len(new[0]), dtype=np.int8)])
+    order = np.lexsort((source, merged[1], merged[0]))
+    merged = [column[order] for column in merged]
+
+    # Keep the last row of every (crypto_id, timestamp) group, which is the new one when both exist
+    ids, timestamps = merged[0], merged[1]
+    keep = np.ones(len(ids), dtype=bool)
+    keep[:-1] = (ids[1:] != ids[:-1]) | (timestamps[1:] != timestamps[:-1])
+    return tuple(column[keep] for column in merged)
+
+class MappedPriceSnapshot:
+    """One immutable snapshot version, memory-mapped read-only so every API worker shares the same page cache."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "header.json")) as f:
+            self.header = json.load(f)
+        self.version = self.header["version"]
+        self.generation = self.header["generation"]
+        self.columns = tuple(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS)
+        # Index header: row range of each coin inside the columns
+        self.index = {int(crypto_id): (start, end) for crypto_id, (start, end) in self.header["index"].items()}
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def cryptocurrencies(self):
+        """Returns the cryptocurrencies table as it was when the snapshot was written."""
+        return self.header["cryptocurrencies"]
+
+    def coin_columns(self, crypto_id: int):
+        """Returns (timestamps, close, volume, market_cap) views of one coin, or None if it has no rows."""
+        if crypto_id not in self.index:
+            return None
+        start, end = self.index[crypto_id]
+        return tuple(column[start:end] for column in self.columns[1:])
+
+    def select(self, crypto_ids, start_timestamp: int = None):
+        """Returns the columns of the given coins, optionally from a timestamp on, still sorted by coin and time."""
+        ids, timestamps = self.columns[0], self.columns[1]
+        mask = np.isin(ids, np.asarray(list(crypto_ids), dtype=np.int64))
+        if start_timestamp is not None:
+            mask &= timestamps >= start_timestamp
+        return tuple(np.asarray(column[mask]) for column in self.columns)
+
+# Serialize writers (e.g. several sharded ETL workers on one node), so no version is built from a stale predecessor
+@contextmanager
+def snapshot_write_lock(directory=PRICE_SNAPSHOT_DIR):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# Write a new snapshot version and point CURRENT at it; readers switch on their next access
+def write_price_snapshot(columns, cryptocurrencies, generation, directory=PRICE_SNAPSHOT_DIR, keep=PRICE_SNAPSHOT_KEEP):
+    os.makedirs(directory, exist_ok=True)
+    version = f"v{generation:010d}-{uuid.uuid4().hex[:8]}"
+    tmp_path = os.path.join(directory, f".{version}.tmp")
+    os.makedirs(tmp_path)
+
+    if columns is None:
+        columns = (
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+        )
+    for name, column in zip(COLUMNS, columns):
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(column))
+
+    unique_ids, starts = np.unique(columns[0], return_index=True)
+    ends = np.append(starts[1:], len(columns[0]))
+    header = {
+        "version": version,
+        "generation": generation,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "rows": int(len(columns[0])),
+        "index": {str(int(crypto_id)): [int(start), int(end)] for crypto_id, start, end in zip(unique_ids, starts, ends)},
+        "cryptocurrencies": cryptocurrencies,
+    }
+    with open(os.path.join(tmp_path, "header.json"), "w") as f:
+        json.dump(header, f, default=str)
+
+    # Publish the complete directory, then swap the pointer atomically
+    os.rename(tmp_path, os.path.join(directory, version))
+    pointer_tmp = os.path.join(directory, f"CURRENT.{os.getpid()}.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(directory, "CURRENT"))
+
+    prune_price_snapshots(directory, keep, current=version)
+    return version
+
+# Remove old versions; workers still mapping one keep reading it until they swap, since unlinked files stay mapped
+def prune_price_snapshots(directory=PRICE_SNAPSHOT_DIR, keep=PRICE_SNAPSHOT_KEEP, current=None):
+    versions = sorted(name for name in os.listdir(directory) if name.startswith("v"))
+    for name in versions[:-keep] if keep > 0 else []:
+        if name != current:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+class PriceSnapshotReader:
+    """Follows the CURRENT pointer of the snapshot directory and swaps to new versions as they are published."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.snapshot = None
+        self.signature = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Returns the current snapshot, or None if none has been written (or snapshots are disabled)."""
+        if not self.directory:
+            return None
+        pointer = os.path.join(self.directory, "CURRENT")
+        try:
+            stat = os.stat(pointer)
+        except OSError:
+            return None
+
+        # Only re-read the pointer when it changed on disk
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if signature == self.signature:
+            return self.snapshot
+        with self.lock:
+            if signature != self.signature:
+                try:
+                    with open(pointer) as f:
+                        version = f.read().strip()
+                    if self.snapshot is None or self.snapshot.version != version:
+                        self.snapshot = MappedPriceSnapshot(os.path.join(self.directory, version))
+                    self.signature = signature
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Error opening price snapshot: {e}")
+            return self.snapshot
+
+    def read_columns(self):
+        """Returns in-memory copies of the current columns, or None; used to build the next version."""
+        snapshot = self.get()
+        return tuple(np.array(column) for column in snapshot.columns) if snapshot is not None else None
+
+_reader = PriceSnapshotReader(PRICE_SNAPSHOT_DIR)
+
+# Function to get the shared snapshot reader
+def get_price_snapshot_reader():
+    return _reader
@@ -0,0 +1,187 @@
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from models.cryptocurrency import Cryptocurrency
+from repositories.factory import get_repository
+from repositories.cache import QueryCache, current_generation
+from repositories.price_snapshot import get_price_snapshot_reader
+
+# Column sets kept for the current generation when no snapshot matches it (whole columns can be large)
+FALLBACK_COLUMNS_MAX_ENTRIES = 16
+
+# Convert a datetime (naive values are treated as UTC) to epoch seconds
+def to_timestamp(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+class PriceSeries:
+    """Contiguous arrays with the price history of one cryptocurrency, sorted by timestamp (epoch seconds)."""
+
+    __slots__ = ("crypto_id", "timestamps", "close", "volume", "market_cap")
+
+    def __init__(self, crypto_id, timestamps, close, volume, market_cap):
+        self.crypto_id = crypto_id
+        self.timestamps = timestamps
+        self.close = close
+        self.volume = volume
+        self.market_cap = market_cap
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def window(self, start: datetime = None, end: datetime = None):
+        """Returns the samples between two dates (inclusive) as views over the same arrays."""
+        lo = np.searchsorted(self.timestamps, to_timestamp(start), side="left") if start else 0
+        hi = np.searchsorted(self.timestamps, to_timestamp(end), side="right") if end else len(self)
+        return PriceSeries(
+            self.crypto_id,
+            self.timestamps[lo:hi],
+            self.close[lo:hi],
+            self.volume[lo:hi],
+            self.market_cap[lo:hi],
+        )
+
+    def as_of(self, date: datetime):
+        """Returns the latest close price at or before a date, or None if there is no earlier sample."""
+        index = np.searchsorted(self.timestamps, to_timestamp(date), side="right") - 1
+        return float(self.close[index]) if index >= 0 else None
+
+    def latest(self):
+        """Returns the most recent close price, or None for an empty series."""
+        return float(self.close[-1]) if len(self) else None
+
+class PriceStore:
+    """
+    Columnar store of historical prices. Served zero-copy from the memory-mapped snapshot published by the ETL
+    when it matches the current generation; otherwise loaded in bulk from the repository and kept in-process.
+    """
+
+    def __init__(self):
+        self.series = {}  # crypto_id -> PriceSeries
+        self.generation = None
+        self.lock = threading.Lock()
+        self.cryptocurrencies = (None, None)  # (snapshot version, models) of the last snapshot read
+        self.fallback_columns = QueryCache(max_entries=FALLBACK_COLUMNS_MAX_ENTRIES)
+        self.fallback_lock = threading.Lock()
+
+    @staticmethod
+    def current_snapshot():
+        """Returns the memory-mapped snapshot if it holds the data of the current ETL generation."""
+        snapshot = get_price_snapshot_reader().get()
+        if snapshot is not None and snapshot.generation == current_generation():
+            return snapshot
+        return None
+
+    def get_cryptocurrencies(self):
+        """Returns the cryptocurrencies table stored in the current snapshot, or None if no snapshot matches the generation."""
+        snapshot = self.current_snapshot()
+        if snapshot is None:
+            return None
+        version, models = self.cryptocurrencies
+        if version != snapshot.version:
+            # Parse the header rows once per snapshot version
+            models = [Cryptocurrency.model_validate(row) for row in snapshot.cryptocurrencies()]
+            self.cryptocurrencies = (snapshot.version, models)
+        return list(models)
+
+    def get_series(self, crypto_ids: list[int]):
+        """Returns the price series of the given cryptocurrencies, loading the missing ones in one query."""
+        snapshot = self.current_snapshot()
+        if snapshot is not None:
+            series = {}
+            for crypto_id in crypto_ids:
+                columns = snapshot.coin_columns(crypto_id)
+                if columns is not None:
+                    series[crypto_id] = PriceSeries(crypto_id, *columns)
+            return series
+
+        with self.lock:
+            # A new ETL generation makes every loaded series obsolete
+            generation = current_generation()
+            if generation != self.generation:
+                self.series = {}
+                self.generation = generation
+            missing = [crypto_id for crypto_id in set(crypto_ids) if crypto_id not in self.series]
+
+        if missing:
+            loaded = self._load(missing)
+            with self.lock:
+                if generation == self.generation:
+                    self.series.update(loaded)
+        else:
+            loaded = {}
+
+        with self.lock:
+            found = {**loaded, **self.series}
+        return {crypto_id: found[crypto_id] for crypto_id in crypto_ids if crypto_id in found}
+
+    def get(self, crypto_id: int):
+        """Returns the price series of a single cryptocurrency, or None if it has no history."""
+        return self.get_series([crypto_id]).get(crypto_id)
+
+    def get_columns(self, crypto_ids: list[int], start_date: datetime = None):
+        """Returns whole (crypto_id, timestamp, close, volume, market cap) columns sorted by coin and time, or None."""
+        snapshot = self.current_snapshot()
+        if snapshot is not None:
+            columns = snapshot.select(crypto_ids, to_timestamp(start_date) if start_date else None)
+            return columns if len(columns[0]) else None
+
+        # Without a matching snapshot (snapshots disabled, or one being published) the columns come from the database,
+        # loaded once per generation. Start dates are rounded down to the day so requests relative to now share an
+        # entry, and one load runs at a time so concurrent requests after a new generation wait for it instead of
+        # all scanning the table
+        start_timestamp = to_timestamp(start_date) if start_date else None
+        start_day = datetime.fromtimestamp(start_timestamp // 86400 * 86400, tz=timezone.utc) if start_date else None
+        key = (tuple(sorted(set(crypto_ids))), start_day)
+        with self.fallback_lock:
+            columns = self.fallback_columns.get_or_load(
+                key, lambda: build_price_columns(get_repository().get_historical_price_rows(list(key[0]), start_date=start_day))
+            )
+        if columns is None or start_timestamp is None:
+            return columns
+        mask = columns[1] >= start_timestamp
+        return tuple(column[mask] for column in columns) if mask.any() else None
+
+    @staticmethod
+    def _load(crypto_ids):
+        columns = build_price_columns(get_repository().get_historical_price_rows(crypto_ids))
+        if columns is None:
+            return {}
+        ids, timestamps, close, volume, market_cap = columns
+
+        # Split the sorted columns into one contiguous block per coin
+        unique_ids, starts = np.unique(ids, return_index=True)
+        ends = np.append(starts[1:], len(ids))
+
+        return {
+            int(crypto_id): PriceSeries(
+                int(crypto_id),
+                timestamps[start:end],
+                close[start:end],
+                volume[start:end],
+                market_cap[start:end],
+            )
+            for crypto_id, start, end in zip(unique_ids, starts, ends)
+        }
+
+# Build whole columns (crypto_id, timestamp, close, volume, market cap) from raw rows, sorted by coin and time
+def build_price_columns(rows):
+    if not rows:
+        return None
+
+    ids = np.fromiter((row["crypto_id"] for row in rows), dtype=np.int64, count=len(rows))
+    timestamps = np.array([row["date"][:19] for row in rows], dtype="datetime64[s]").astype(np.int64)
+    close = np.fromiter((row["close_price"] for row in rows), dtype=np.float64, count=len(rows))
+    volume = np.fromiter((row["total_volume"] or 0.0 for row in rows), dtype=np.float64, count=len(rows))
+    market_cap = np.fromiter((row["market_cap"] or 0.0 for row in rows), dtype=np.float64, count=len(rows))
+
+    # Sort once so every coin is a contiguous, ordered block
+    order = np.lexsort((timestamps, ids))
+    return ids[order], timestamps[order], close[order], volume[order], market_cap[order]
+
+_price_store = PriceStore()
+
+# Function to get the shared price store instance
+def get_price_store():
+    return _price_store
@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from config import ANALYTICS_SNAPSHOT_DIR
+from repositories.cache import current_generation
+
+class AnalyticsSnapshotStore:
+    """Stores the analytics computed at the end of an ETL cycle, one versioned JSON document per analysis."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.loaded = {}  # name -> (file signature, snapshot)
+        self.lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def save(self, name: str, data, generation: int):
+        """Writes a snapshot atomically so readers see either the previous or the new version."""
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot = {
+            "name": name,
+            "generation": generation,
+            "computed_at": datetime.now(timezone.utc).isoformat(),
+            "data": data,
+        }
+        path = self._path(name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def load(self, name: str):
+        """Returns the latest snapshot of an analysis, or None if none was written."""
+        path = self._path(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        # Only parse the file again when it changed on disk
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.loaded.get(name)
+            if cached and cached[0] == signature:
+                return cached[1]
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            self.loaded[name] = (signature, snapshot)
+        return snapshot
+
+    def load_current(self, name: str):
+        """Returns the snapshot only if it was computed from the data of the current ETL generation."""
+        snapshot = self.load(name)
+        if snapshot and snapshot["generation"] == current_generation():
+            return snapshot
+        return None
+
+_snapshot_store = AnalyticsSnapshotStore(ANALYTICS_SNAPSHOT_DIR)
+
+# Function to get the shared snapshot store instance
+def get_snapshot_store():
+    return _snapshot_store
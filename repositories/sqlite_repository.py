@@ -0,0 +1,306 @@
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from models.cryptocurrency import Cryptocurrency, HistoricalPrice
+from repositories.base_repository import BaseCryptoRepository
+from config import SQLITE_PATH, AS_OF_MAX_STALENESS_DAYS, HISTORY_PAGE_SIZE
+from metrics import track_queries
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cryptocurrencies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    coingecko_id TEXT NOT NULL UNIQUE,
+    symbol TEXT NOT NULL,
+    name TEXT NOT NULL,
+    current_price REAL NOT NULL,
+    market_cap REAL NOT NULL,
+    total_volume REAL NOT NULL,
+    last_updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cryptocurrencies_symbol ON cryptocurrencies (symbol);
+
+CREATE TABLE IF NOT EXISTS historical_prices (
+    id TEXT PRIMARY KEY,
+    crypto_id INTEGER NOT NULL REFERENCES cryptocurrencies (id),
+    coingecko_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    close_price REAL NOT NULL,
+    total_volume REAL NOT NULL,
+    market_cap REAL NOT NULL,
+    UNIQUE (crypto_id, date)
+);
+CREATE INDEX IF NOT EXISTS idx_historical_prices_date_volume ON historical_prices (date, total_volume);
+
+CREATE TABLE IF NOT EXISTS etl_leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+"""
+
+# Dates are stored as ISO 8601 text without timezone, so string comparison follows time order
+def to_iso(value):
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat(timespec="seconds")
+    return str(value)[:19]
+
+class SQLiteDatabase:
+    _local = threading.local()  # One connection per thread; SQLite connections are not shared across threads
+    _schema_lock = threading.Lock()
+    _schema_ready = set()
+
+    @classmethod
+    def get_connection(cls, path: str = SQLITE_PATH) -> sqlite3.Connection:
+        connections = getattr(cls._local, "connections", None)
+        if connections is None:
+            connections = cls._local.connections = {}
+        if path not in connections:
+            connection = sqlite3.connect(path)
+            connection.row_factory = sqlite3.Row
+            # WAL lets API readers run while the ETL writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with cls._schema_lock:
+                if path not in cls._schema_ready:
+                    connection.executescript(SCHEMA)
+                    cls._schema_ready.add(path)
+            connections[path] = connection
+        return connections[path]
+
+class SQLiteCryptoRepository(BaseCryptoRepository):
+    """Embedded storage backend for offline runs, read replicas and performance tests."""
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+
+    @property
+    def connection(self):
+        # Resolve the connection on every call, since the repository may be used from several threads
+        return SQLiteDatabase.get_connection(self.path)
+
+    @track_queries("sqlite")
+    def get_all_cryptocurrencies(self):
+        """Fetches all cryptocurrencies from the database."""
+        rows = self.connection.execute("SELECT * FROM cryptocurrencies ORDER BY id").fetchall()
+        return [Cryptocurrency(**dict(row)) for row in rows]
+
+    @track_queries("sqlite")
+    def get_cryptocurrency_by_symbol(self, symbol: str):
+        """Fetches a specific cryptocurrency by its symbol."""
+        row = self.connection.execute("SELECT * FROM cryptocurrencies WHERE symbol = ?", (symbol,)).fetchone()
+        return Cryptocurrency(**dict(row)) if row else None
+
+    @track_queries("sqlite")
+    def upsert_cryptocurrencies(self, cryptos: list[Cryptocurrency]):
+        """Inserts or updates many cryptocurrency records in a single transaction and returns the stored rows."""
+        records = {
+            crypto.coingecko_id: (
+                crypto.coingecko_id, crypto.symbol, crypto.name, crypto.current_price,
+                crypto.market_cap, crypto.total_volume, to_iso(crypto.last_updated)
+            )
+            for crypto in cryptos
+        }
+        if not records:
+            return []
+        with self.connection:
+            self.connection.executemany(
+                """
+                INSERT INTO cryptocurrencies
+                    (coingecko_id, symbol, name, current_price, market_cap, total_volume, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (coingecko_id) DO UPDATE SET
+                    symbol = excluded.symbol,
+                    name = excluded.name,
+                    current_price = excluded.current_price,
+                    market_cap = excluded.market_cap,
+                    total_volume = excluded.total_volume,
+                    last_updated = excluded.last_updated
+                """,
+                list(records.values())
+            )
+        placeholders = ",".join("?" * len(records))
+        rows = self.connection.execute(
+            f"SELECT * FROM cryptocurrencies WHERE coingecko_id IN ({placeholders})", list(records)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    @track_queries("sqlite")
+    def get_latest_historical_date(self, coingecko_id: str):
+        """Fetches the date of the most recent historical price stored for a cryptocurrency."""
+        row = self.connection.execute(
+            """
+            SELECT MAX(date) FROM historical_prices
+            WHERE crypto_id = (SELECT id FROM cryptocurrencies WHERE coingecko_id = ?)
+            """,
+            (coingecko_id,)
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    @track_queries("sqlite")
+    def upsert_historical_prices(self, historical_prices: list[dict]):
+        """Inserts or updates historical price records, one per cryptocurrency and day."""
+        with self.connection:
+            self.connection.executemany(
+                """
+                INSERT INTO historical_prices
+                    (id, crypto_id, coingecko_id, date, close_price, total_volume, market_cap)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (crypto_id, date) DO UPDATE SET
+                    close_price = excluded.close_price,
+                    total_volume = excluded.total_volume,
+                    market_cap = excluded.market_cap
+                """,
+                [
+                    (
+                        str(uuid.uuid4()), row["crypto_id"], row["coingecko_id"], to_iso(row["date"]),
+                        row["close_price"], row["total_volume"], row["market_cap"]
+                    )
+                    for row in historical_prices
+                ]
+            )
+
+    @track_queries("sqlite")
+    def _historical_prices(self, crypto_id, start_date=None, end_date=None, limit=None, before=None):
+        sql = "SELECT * FROM historical_prices WHERE crypto_id = ?"
+        params = [crypto_id]
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(to_iso(start_date))
+        if end_date:
+            sql += " AND date <= ?"
+            params.append(to_iso(end_date))
+        # Keyset pagination: continue right after the last date of the previous page
+        if before:
+            sql += " AND date < ?"
+            params.append(to_iso(before))
+        sql += " ORDER BY date DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [HistoricalPrice(**dict(row)) for row in self.connection.execute(sql, params)]
+
+    def get_historical_prices_by_crypto_id(self, crypto_id: int, start_date=None, end_date=None, limit=None, before=None):
+        """Fetches historical prices for a given cryptocurrency ID within a specified date range, newest first."""
+        return self._historical_prices(crypto_id, start_date, end_date, limit, before)
+
+    def iter_historical_prices(self, crypto_id: int, start_date=None, end_date=None, page_size=HISTORY_PAGE_SIZE):
+        """Yields pages of historical prices, newest first, keeping only one page in memory at a time."""
+        before = None
+        while True:
+            page = self._historical_prices(crypto_id, start_date, end_date, page_size, before)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            before = page[-1].date
+
+    @track_queries("sqlite")
+    def get_price_on_date(self, crypto_id: int, date: datetime):
+        """Fetches the closing price of a cryptocurrency on a specific date."""
+        start_of_day = datetime(date.year, date.month, date.day)
+        row = self.connection.execute(
+            "SELECT close_price FROM historical_prices WHERE crypto_id = ? AND date >= ? AND date < ? LIMIT 1",
+            (crypto_id, to_iso(start_of_day), to_iso(start_of_day + timedelta(days=1)))
+        ).fetchone()
+        return row[0] if row else None
+
+    @track_queries("sqlite")
+    def get_historical_price_rows(self, crypto_ids: list[int], start_date: datetime = None):
+        """Fetches the raw historical price rows of many cryptocurrencies, sorted by crypto ID and date."""
+        placeholders = ",".join("?" * len(crypto_ids))
+        sql = (
+            "SELECT crypto_id, date, close_price, total_volume, market_cap FROM historical_prices "
+            f"WHERE crypto_id IN ({placeholders})"
+        )
+        params = list(crypto_ids)
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(to_iso(start_date))
+        sql += " ORDER BY crypto_id, date"
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    @track_queries("sqlite")
+    def get_prices_as_of(self, lookups: list[tuple[int, datetime]], max_staleness_days: int = AS_OF_MAX_STALENESS_DAYS):
+        """Resolves the latest closing price at or before each (crypto_id, date) pair with a single query."""
+        lookups = list(dict.fromkeys(lookups))
+        if not lookups:
+            return {}
+
+        # Each lookup is answered by one index seek on (crypto_id, date)
+        values = ",".join("(?, ?, ?, ?)" for _ in lookups)
+        params = []
+        for index, (crypto_id, date) in enumerate(lookups):
+            params.extend([index, crypto_id, to_iso(date), to_iso(date - timedelta(days=max_staleness_days))])
+        rows = self.connection.execute(
+            f"""
+            WITH lookups (position, crypto_id, as_of, not_before) AS (VALUES {values})
+            SELECT l.position, (
+                SELECT h.close_price FROM historical_prices h
+                WHERE h.crypto_id = l.crypto_id AND h.date <= l.as_of AND h.date >= l.not_before
+                ORDER BY h.date DESC
+                LIMIT 1
+            )
+            FROM lookups l
+            """,
+            params
+        ).fetchall()
+        return {lookups[position]: price for position, price in rows}
+
+    @track_queries("sqlite")
+    def get_highest_volume_crypto(self):
+        """Fetches the cryptocurrency with the highest trading volume in the last 24 hours."""
+        last_24_hours = datetime.now() - timedelta(hours=24)
+        row = self.connection.execute(
+            """
+            SELECT crypto_id, coingecko_id, total_volume FROM historical_prices
+            WHERE date >= ?
+            ORDER BY total_volume DESC
+            LIMIT 1
+            """,
+            (to_iso(last_24_hours),)
+        ).fetchone()
+        return dict(row) if row else None
+
+    @track_queries("sqlite")
+    def get_market_dominance(self):
+        """Calculates each cryptocurrency's share of the total market cap (in percent) in SQL."""
+        rows = self.connection.execute(
+            """
+            SELECT id AS crypto_id, coingecko_id, market_cap * 100.0 / SUM(market_cap) OVER () AS dominance
+            FROM cryptocurrencies
+            WHERE market_cap > 0
+            ORDER BY id
+            """
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    @track_queries("sqlite")
+    def acquire_lease(self, name: str, owner: str, ttl: float):
+        """Takes or renews a named ETL lease (e.g. a shard); fails while another owner holds it unexpired."""
+        now = datetime.now(timezone.utc)
+        with self.connection:
+            # The conflict update only applies when we already own the lease or it has expired, so it is atomic
+            cursor = self.connection.execute(
+                """
+                INSERT INTO etl_leases (name, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    owner = excluded.owner,
+                    expires_at = excluded.expires_at
+                WHERE etl_leases.owner = excluded.owner OR etl_leases.expires_at < ?
+                """,
+                (name, owner, to_iso(now + timedelta(seconds=ttl)), to_iso(now))
+            )
+        return cursor.rowcount == 1
+
+    @track_queries("sqlite")
+    def release_lease(self, name: str, owner: str):
+        """Gives up a named ETL lease held by the owner."""
+        with self.connection:
+            self.connection.execute("DELETE FROM etl_leases WHERE name = ? AND owner = ?", (name, owner))
+
+    @track_queries("sqlite")
+    def get_leases(self):
+        """Fetches every ETL lease, with `expires_at` as a naive UTC datetime."""
+        rows = self.connection.execute("SELECT name, owner, expires_at FROM etl_leases ORDER BY name").fetchall()
+        return [{**dict(row), "expires_at": datetime.fromisoformat(row["expires_at"])} for row in rows]
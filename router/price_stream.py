@@ -0,0 +1,120 @@
+import asyncio
+from config import PRICE_STREAM_POLL_INTERVAL, PRICE_STREAM_MAX_CLIENTS
+from repositories.cache import current_generation
+from use_cases.crypto_use_cases import GetAllCryptocurrenciesUseCase
+from metrics import PRICE_STREAM_CONFLATED
+
+class Subscription:
+    """
+    Updates waiting to be sent to one client. A newer row replaces the pending one of the same coin, so a slow
+    client holds at most one row per coin and skips straight to the latest prices instead of falling behind.
+    """
+
+    def __init__(self, symbols=None):
+        self.symbols = {symbol.lower() for symbol in symbols} if symbols else None
+        self.pending = {}  # coingecko_id -> serialized row
+        self.event = asyncio.Event()
+
+    def offer(self, rows):
+        """Queues the rows this client is subscribed to; `rows` holds (coingecko_id, symbol, json) tuples."""
+        for coingecko_id, symbol, row_json in rows:
+            if self.symbols is not None and symbol.lower() not in self.symbols:
+                continue
+            if coingecko_id in self.pending:
+                PRICE_STREAM_CONFLATED.inc()
+            self.pending[coingecko_id] = row_json
+        if self.pending:
+            self.event.set()
+
+    def take(self):
+        """Returns the pending rows as a JSON array (possibly empty) and clears them."""
+        self.event.clear()
+        batch, self.pending = self.pending, {}
+        return "[" + ",".join(batch.values()) + "]"
+
+    async def next_batch(self, timeout: float):
+        """Waits up to `timeout` seconds for updates and returns them as a JSON array, or None if there were none."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.take()
+
+class PriceBroadcaster:
+    """
+    Single source of the live price stream of an API worker. One background task watches the ETL generation and,
+    when it changes, reads the cryptocurrencies once, serializes the rows that changed and hands them to every
+    subscriber, so the cost per cycle does not grow with the number of connected clients.
+    """
+
+    def __init__(self, poll_interval: float = PRICE_STREAM_POLL_INTERVAL, max_clients: int = PRICE_STREAM_MAX_CLIENTS):
+        self.poll_interval = poll_interval
+        self.max_clients = max_clients
+        self.subscribers = set()
+        self.rows = {}  # coingecko_id -> (coingecko_id, symbol, json) of the last published state
+        self.generation = None
+        self.task = None
+        self.refreshing = None
+
+    def is_full(self):
+        return len(self.subscribers) >= self.max_clients
+
+    async def ensure_current(self):
+        """Refreshes the rows if they are stale, e.g. because nobody was listening when the last ETL cycle finished."""
+        if self.generation != current_generation():
+            await self.refresh()
+
+    async def subscribe(self, symbols=None):
+        """Registers a client; its first batch is the current state of the coins it follows."""
+        await self.ensure_current()
+        subscription = Subscription(symbols)
+        subscription.offer(self.rows.values())
+        self.subscribers.add(subscription)
+
+        # The watcher only runs while someone is listening (and is restarted if its event loop went away)
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.watch())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    async def refresh(self):
+        """Reads the cryptocurrencies and publishes the rows that changed; concurrent callers share one read."""
+        if self.refreshing is None or self.refreshing.done() or self.refreshing.get_loop() is not asyncio.get_running_loop():
+            self.refreshing = asyncio.ensure_future(self._refresh())
+        return await asyncio.shield(self.refreshing)
+
+    async def _refresh(self):
+        generation = current_generation()
+        cryptos = await GetAllCryptocurrenciesUseCase.execute_async()
+        if not cryptos and self.rows:
+            return []  # A failed read; keep the last state and retry on the next poll
+
+        # Serialize each row once, whatever the number of subscribers
+        rows = {crypto.coingecko_id: (crypto.coingecko_id, crypto.symbol, crypto.model_dump_json()) for crypto in cryptos}
+        changed = [row for coingecko_id, row in rows.items() if self.rows.get(coingecko_id) != row]
+        self.rows = rows
+        self.generation = generation
+        for subscription in list(self.subscribers):
+            subscription.offer(changed)
+        return changed
+
+    async def watch(self):
+        while self.subscribers:
+            await asyncio.sleep(self.poll_interval)
+            if current_generation() != self.generation:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing the live price stream: {str(e)}")
+
+    def stats(self):
+        return {"subscribers": len(self.subscribers), "generation": self.generation}
+
+_broadcaster = PriceBroadcaster()
+
+# Function to get the shared price broadcaster of this worker
+def get_price_broadcaster():
+    return _broadcaster
@@ -0,0 +1,178 @@
+import hashlib
+import zlib
+from datetime import datetime, timezone
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from config import RESPONSE_COMPRESSION_MIN_BYTES, RESPONSE_GZIP_LEVEL, RESPONSE_BROTLI_QUALITY
+from repositories.cache import current_generation
+
+# Brotli is optional; without it responses are only gzip-compressed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class FastJSONResponse(ORJSONResponse):
+    """JSON response rendered by orjson, including Pydantic models and NumPy values, without jsonable_encoder."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+# Analytics are computed over windows ending now (last N days, last 24 hours), so their results also change with the date
+DATED_ETAG_PREFIXES = ("/crypto/analysis/",)
+
+# Entity tags: the ETL generation and the request URL, so a tag only changes when new data is loaded, plus the
+# current UTC date for analytics so a window that moved on is not answered with 304
+def data_etag(path: str, query: str):
+    generation = current_generation()
+    if not generation:
+        return None  # No recorded load, so there is no data version to derive a tag from
+    anchor = datetime.now(timezone.utc).date().isoformat() if path.startswith(DATED_ETAG_PREFIXES) else ""
+    digest = hashlib.blake2b(f"{path}?{query}#{anchor}".encode(), digest_size=8).hexdigest()
+    return f'"{generation:x}-{digest}"'
+
+# Compressed variants carry the encoding in their tag; If-None-Match compares tags without it
+ETAG_ENCODING_SUFFIXES = ("-gzip\"", "-br\"")
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        for suffix in ETAG_ENCODING_SUFFIXES:
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+        if tag == etag or tag == "*":
+            return True
+    return False
+
+# Pick brotli or gzip from Accept-Encoding, or None if the client accepts neither
+def accepted_encoding(accept_encoding: str):
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain")
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least `minimum_size` bytes with brotli or gzip, as the client accepts. Streamed
+    responses are compressed chunk by chunk so they keep streaming; server-sent events are never compressed.
+    """
+
+    def __init__(self, app, minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES, gzip_level: int = RESPONSE_GZIP_LEVEL,
+                 brotli_quality: int = RESPONSE_BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compressor(self, encoding: str):
+        return _BrotliCompressor(self.brotli_quality) if encoding == "br" else _GzipCompressor(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        buffered = []  # Body chunks held back until the response is known to reach the minimum size
+        buffered_size = 0
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, buffered_size, compressor, passthrough
+            if passthrough or message["type"] not in ("http.response.start", "http.response.body"):
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if "content-encoding" in headers or content_type not in COMPRESSIBLE_TYPES:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                data = compressor.compress(body) + (b"" if more_body else compressor.finish())
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            # Bodies of known length are compressed whole; streamed ones once they reach the minimum size
+            headers = MutableHeaders(raw=start_message["headers"])
+            buffered.append(body)
+            buffered_size += len(body)
+            if more_body and ("content-length" in headers or buffered_size < self.minimum_size):
+                return
+            body = b"".join(buffered)
+            buffered.clear()
+            if buffered_size < self.minimum_size:
+                # The whole body is smaller than the threshold: send it as it is
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            compressor = self.compressor(encoding)
+            headers["Content-Encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and etag.endswith('"') and not etag.startswith("W/"):
+                headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+            if more_body:
+                # Still streaming: compress chunk by chunk without a known length
+                del headers["Content-Length"]
+                await send(start_message)
+                await send({"type": "http.response.body", "body": compressor.compress(body), "more_body": True})
+            else:
+                data = compressor.compress(body) + compressor.finish()
+                headers["Content-Length"] = str(len(data))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": data})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,63 +1,207 @@
-from fastapi import APIRouter, HTTPException, Query
-from datetime import datetime
+import csv
+import io
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
 from use_cases.crypto_use_cases import (
     GetAllCryptocurrenciesUseCase,
     GetCryptocurrencyBySymbolUseCase,
     GetHistoricalPricesByCryptoIdUseCase,
+    GetCandlesUseCase,
     CalculateCryptoROIUseCase,
     GetHighestVolumeCryptoUseCase,
     CalculateCorrelationUseCase,
+    CalculateCorrelationMatrixUseCase,
     CalculateVolatilityUseCase,
+    CalculateIndicatorsUseCase,
     CalculateMarketDominanceUseCase,
     AnalyzePriceTrendUseCase,
     ComparePerformanceUseCase,
 )
+from router.single_flight import SingleFlight
+from router.price_stream import get_price_broadcaster
+from router.responses import FastJSONResponse
+from use_cases.indicators import parse_indicators
+from config import PRICE_STREAM_KEEPALIVE
+from metrics import PRICE_STREAM_EVENTS
+from repositories.snapshot_store import get_snapshot_store
 
 router = APIRouter(prefix="/crypto", tags=["cryptocurrency"])
 
+# Concurrent identical analytics requests share one computation
+analytics_calls = SingleFlight()
+
+# Serve an analysis from the snapshot computed by the last ETL cycle, falling back to a live computation
+async def snapshot_or_compute(name, response: Response, key, func, *args, **kwargs):
+    snapshot = get_snapshot_store().load_current(name)
+    if snapshot is not None:
+        response.headers["X-Data-Source"] = "snapshot"
+        response.headers["X-Data-Computed-At"] = snapshot["computed_at"]
+        return snapshot["data"]
+
+    result = await analytics_calls.run(key, func, *args, **kwargs)
+    response.headers["X-Data-Source"] = "live"
+    response.headers["X-Data-Computed-At"] = datetime.now(timezone.utc).isoformat()
+    return result
+
 # Endpoint to get all cryptocurrencies
 @router.get("/")
-def get_all_cryptocurrencies():
+async def get_all_cryptocurrencies():
     try:
-        return GetAllCryptocurrenciesUseCase.execute()
+        # Rendered straight from the models by orjson, skipping FastAPI's generic encoder
+        return FastJSONResponse(await GetAllCryptocurrenciesUseCase.execute_async())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint to get a specific cryptocurrency by symbol
 @router.get("/{symbol}")
-def get_cryptocurrency(symbol: str):
+async def get_cryptocurrency(symbol: str):
     try:
-        crypto = GetCryptocurrencyBySymbolUseCase.execute(symbol)
+        crypto = await GetCryptocurrencyBySymbolUseCase.execute_async(symbol)
         if not crypto:
             raise HTTPException(status_code=404, detail="Cryptocurrency not found")
         return crypto
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Server-sent events of one client: the current rows first, then only the rows changed by each ETL cycle.
+# The client subscribes only once the response starts streaming, so a request that never gets that far leaves
+# nothing registered
+async def price_events(request: Request, symbols=None):
+    broadcaster = get_price_broadcaster()
+    subscription = None
+    try:
+        subscription = await broadcaster.subscribe(symbols)
+        PRICE_STREAM_EVENTS.inc(event="snapshot")
+        yield f"event: snapshot\nid: {broadcaster.generation}\ndata: {subscription.take()}\n\n"
+        while not await request.is_disconnected():
+            batch = await subscription.next_batch(PRICE_STREAM_KEEPALIVE)
+            if batch is None:
+                # A comment line keeps idle connections open through proxies
+                PRICE_STREAM_EVENTS.inc(event="keepalive")
+                yield ": keepalive\n\n"
+                continue
+            PRICE_STREAM_EVENTS.inc(event="update")
+            yield f"event: update\nid: {broadcaster.generation}\ndata: {batch}\n\n"
+    finally:
+        if subscription is not None:
+            broadcaster.unsubscribe(subscription)
+
+# Endpoint to stream live prices
+@router.get("/stream/prices")
+async def stream_prices(request: Request, symbols: list[str] = Query(None)):
+    """
+    Streams cryptocurrency rows as server-sent events. The first `snapshot` event holds the current rows, and each
+    `update` event holds the rows changed since the previous event. `symbols` restricts the stream to some coins.
+    """
+    broadcaster = get_price_broadcaster()
+    if broadcaster.is_full():
+        raise HTTPException(status_code=503, detail="Too many live price stream clients")
+    try:
+        # Read the rows before the response starts, so a failing read is still reported as an error status
+        await broadcaster.ensure_current()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        price_events(request, symbols),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Example URL: http://127.0.0.1:8000/crypto/stream/prices?symbols=btc&symbols=eth
+
+# Stream historical prices as newline-delimited JSON, one page at a time
+async def stream_history_ndjson(pages):
+    async for page in pages:
+        yield "".join(price.model_dump_json() + "\n" for price in page)
+
+# Stream historical prices as CSV, one page at a time
+HISTORY_CSV_FIELDS = ["id", "crypto_id", "coingecko_id", "date", "close_price", "total_volume", "market_cap"]
+
+async def stream_history_csv(pages):
+    yield ",".join(HISTORY_CSV_FIELDS) + "\r\n"
+    async for page in pages:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for price in page:
+            writer.writerow([
+                price.id, price.crypto_id, price.coingecko_id, price.date.isoformat(),
+                price.close_price, price.total_volume, price.market_cap
+            ])
+        yield buffer.getvalue()
+
 # Endpoint to get historical prices by cryptocurrency ID
 @router.get("/{id}/history")
-def get_historical_prices(
+async def get_historical_prices(
     id: int,
     start_date: datetime = Query(None),
-    end_date: datetime = Query(None)
+    end_date: datetime = Query(None),
+    limit: int = Query(None, ge=1, le=10000),
+    cursor: datetime = Query(None),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$")
 ):
+    """
+    Returns historical prices, newest first. With `limit`, the `X-Next-Cursor` header holds the `cursor` value
+    for the next page. `format=ndjson` or `format=csv` streams the whole range page by page instead.
+    """
+    # Streaming modes send rows as pages arrive, so memory stays flat for any range size
+    if format == "ndjson":
+        pages = GetHistoricalPricesByCryptoIdUseCase.stream_async(id, start_date=start_date, end_date=end_date)
+        return StreamingResponse(stream_history_ndjson(pages), media_type="application/x-ndjson")
+    if format == "csv":
+        pages = GetHistoricalPricesByCryptoIdUseCase.stream_async(id, start_date=start_date, end_date=end_date)
+        return StreamingResponse(stream_history_csv(pages), media_type="text/csv")
+
     try:
-        response = GetHistoricalPricesByCryptoIdUseCase.execute(id, start_date=start_date, end_date=end_date)
-        if not response:
+        prices = await GetHistoricalPricesByCryptoIdUseCase.execute_async(
+            id, start_date=start_date, end_date=end_date, limit=limit, before=cursor
+        )
+        if not prices:
             raise HTTPException(status_code=404, detail="No historical prices found for this cryptocurrency")
-        return response
+        # A full page means there may be more rows after the last date returned
+        headers = {}
+        if limit and len(prices) == limit:
+            headers["X-Next-Cursor"] = prices[-1].date.isoformat()
+        return FastJSONResponse(prices, headers=headers)
     except Exception as ex:
         raise HTTPException(status_code=500, detail=f"Server error: {str(ex)}")
-    
+
 # Example URL: http://127.0.0.1:8000/crypto/1/history?start_date=2024-10-14
+# Example URL: http://127.0.0.1:8000/crypto/1/history?limit=500&cursor=2024-06-01T00:00:00
+# Example URL: http://127.0.0.1:8000/crypto/1/history?format=ndjson
+
+# Endpoint to get OHLC candles of a cryptocurrency
+@router.get("/{id}/candles")
+async def get_candles(
+    id: int,
+    interval: str = Query("1d", pattern="^(1h|4h|1d|1w)$"),
+    start_date: datetime = Query(None),
+    end_date: datetime = Query(None)
+):
+    """
+    Returns open/high/low/close/volume candles built from the stored samples, oldest first. `time` is the UTC start
+    of each bucket (weeks start on Monday) and `volume` is the sum of the 24h volumes of its samples.
+    """
+    try:
+        return FastJSONResponse(await analytics_calls.run(
+            ("candles", id, interval, start_date, end_date), GetCandlesUseCase.execute, id, interval, start_date, end_date
+        ))
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Example URL: http://127.0.0.1:8000/crypto/1/candles?interval=1w&start_date=2024-01-01
 
 # Endpoint to calculate ROI of a cryptocurrency
 @router.get("/analysis/roi/{id}")
-def calculate_roi(id: int, start_date: str = Query(...), end_date: str = Query(...)):
+async def calculate_roi(id: int, start_date: str = Query(...), end_date: str = Query(...)):
     try:
         start_date_dt = datetime.strptime(start_date, "%Y-%m-%d")
         end_date_dt = datetime.strptime(end_date, "%Y-%m-%d")
-        return CalculateCryptoROIUseCase.execute(id, start_date_dt, end_date_dt)
+        return await analytics_calls.run(
+            ("roi", id, start_date_dt, end_date_dt), CalculateCryptoROIUseCase.execute, id, start_date_dt, end_date_dt
+        )
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
@@ -67,9 +211,9 @@ def calculate_roi(id: int, start_date: str = Query(...), end_date: str = Query(.
 
 # Endpoint to get the cryptocurrency with the highest volume in the last 24 hours
 @router.get("/analysis/volume")
-def get_highest_volume_crypto():
+async def get_highest_volume_crypto(response: Response):
     try:
-        return GetHighestVolumeCryptoUseCase.execute()
+        return await snapshot_or_compute("volume", response, ("volume",), GetHighestVolumeCryptoUseCase.execute)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
@@ -77,12 +221,14 @@ def get_highest_volume_crypto():
 
 # Endpoint to calculate the correlation between two cryptocurrencies
 @router.get("/analysis/correlation")
-def calculate_correlation(crypto_id_1: int = Query(...), crypto_id_2: int = Query(...), days: int = Query(7)):
+async def calculate_correlation(crypto_id_1: int = Query(...), crypto_id_2: int = Query(...), days: int = Query(7)):
     """
     Calculates the correlation between two specified cryptocurrencies over a given number of days.
     """
     try:
-        return CalculateCorrelationUseCase.execute(crypto_id_1, crypto_id_2, days)
+        return await analytics_calls.run(
+            ("correlation", crypto_id_1, crypto_id_2, days), CalculateCorrelationUseCase.execute, crypto_id_1, crypto_id_2, days
+        )
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
@@ -90,22 +236,84 @@ def calculate_correlation(crypto_id_1: int = Query(...), crypto_id_2: int = Quer
     
 # Example URL: http://127.0.0.1:8000/crypto/analysis/correlation?crypto_id_1=1&crypto_id_2=2&days=4
 
+# Endpoint to calculate the correlation matrix of all tracked cryptocurrencies
+@router.get("/analysis/correlation-matrix")
+async def calculate_correlation_matrix(response: Response, days: int = Query(30, gt=1), min_overlap: int = Query(2, ge=2)):
+    """
+    Calculates the pairwise correlation of daily log returns for every tracked cryptocurrency.
+    Coins with fewer than `min_overlap` returns in the window are left out of the matrix.
+    """
+    try:
+        # The ETL precomputes the matrix with the default parameters
+        if days == 30 and min_overlap == 2:
+            return await snapshot_or_compute(
+                "correlation-matrix", response, ("correlation-matrix", days, min_overlap), CalculateCorrelationMatrixUseCase.execute
+            )
+        return await analytics_calls.run(
+            ("correlation-matrix", days, min_overlap), CalculateCorrelationMatrixUseCase.execute, days=days, min_overlap=min_overlap
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Example URL: http://127.0.0.1:8000/crypto/analysis/correlation-matrix?days=30&min_overlap=10
+
 # Endpoint to get the volatility of each cryptocurrency
 @router.get("/analysis/volatility")
-def get_volatility():
+async def get_volatility(response: Response, windows: list[int] = Query([7, 30, 90]), annualize: bool = Query(True)):
+    """
+    Calculates the standard deviation of daily log returns of each cryptocurrency over rolling windows (in days).
+    """
+    if any(window < 2 for window in windows):
+        raise HTTPException(status_code=422, detail="Every window must be at least 2 days")
+    try:
+        # The ETL precomputes the volatility with the default parameters
+        if windows == [7, 30, 90] and annualize:
+            return await snapshot_or_compute("volatility", response, ("volatility", (7, 30, 90), True), CalculateVolatilityUseCase.execute)
+        return await analytics_calls.run(
+            ("volatility", tuple(windows), annualize), CalculateVolatilityUseCase.execute, windows=windows, annualize=annualize
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+# Example URL: http://127.0.0.1:8000/crypto/analysis/volatility?windows=7&windows=30&annualize=true
+
+# Endpoint to calculate technical indicators of several cryptocurrencies
+@router.get("/analysis/indicators")
+async def get_indicators(
+    ids: list[int] = Query(None),
+    indicators: list[str] = Query(["sma:20", "ema:20", "rsi:14", "volatility:30", "max_drawdown", "sharpe"]),
+    days: int = Query(365, ge=2, le=3650),
+    history: bool = Query(False)
+):
+    """
+    Calculates indicators (`sma`, `ema`, `rsi`, `volatility` with an optional `:window` in days, `max_drawdown` and
+    `sharpe`) over the last `days` days for the given coins, or every tracked coin. Each result holds the latest
+    value; `history=true` adds the daily series of the moving indicators.
+    """
     try:
-        return CalculateVolatilityUseCase.execute()
+        specs = parse_indicators(indicators)
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    try:
+        return FastJSONResponse(await analytics_calls.run(
+            ("indicators", tuple(ids or ()), tuple(specs), days, history),
+            CalculateIndicatorsUseCase.execute, specs, crypto_ids=ids, days=days, history=history
+        ))
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-# Example URL: http://127.0.0.1:8000/crypto/analysis/volatility
+
+# Example URL: http://127.0.0.1:8000/crypto/analysis/indicators?ids=1&ids=2&indicators=sma:50&indicators=rsi&days=180
 
 # Endpoint to calculate the market dominance of cryptocurrencies
 @router.get("/analysis/market-dominance")
-def get_market_dominance():
+async def get_market_dominance(response: Response):
     try:
-        return CalculateMarketDominanceUseCase.execute()
+        return await snapshot_or_compute("market-dominance", response, ("market-dominance",), CalculateMarketDominanceUseCase.execute)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
@@ -115,9 +323,9 @@ def get_market_dominance():
 
 # Endpoint to analyze the price trend of a cryptocurrency
 @router.get("/analysis/trend/{id}")
-def analyze_price_trend(id: int, period: int = Query(3, gt=0)):
+async def analyze_price_trend(id: int, period: int = Query(3, gt=0)):
     try:
-        return AnalyzePriceTrendUseCase.execute(crypto_id=id, period=period)
+        return await analytics_calls.run(("trend", id, period), AnalyzePriceTrendUseCase.execute, crypto_id=id, period=period)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
@@ -126,9 +334,11 @@ def analyze_price_trend(id: int, period: int = Query(3, gt=0)):
 
 # Endpoint to compare the performance of multiple cryptocurrencies
 @router.get("/analysis/comparison")
-def compare_performance(ids: list[int] = Query(...), period: int = Query(7, gt=0)):
+async def compare_performance(ids: list[int] = Query(...), period: int = Query(7, gt=0)):
     try:
-        return ComparePerformanceUseCase.execute(crypto_ids=ids, period=period)
+        return await analytics_calls.run(
+            ("comparison", tuple(ids), period), ComparePerformanceUseCase.execute, crypto_ids=ids, period=period
+        )
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
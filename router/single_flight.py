@@ -0,0 +1,19 @@
+import asyncio
+from starlette.concurrency import run_in_threadpool
+
+class SingleFlight:
+    """Lets concurrent identical calls share one in-flight computation instead of repeating it."""
+
+    def __init__(self):
+        self.calls = {}  # key -> asyncio.Task
+
+    async def run(self, key, func, *args, **kwargs):
+        """Runs `func` (sync, in the threadpool) once per key at a time and returns its result to every caller."""
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(func, *args, **kwargs))
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+
+        # Shield the shared task so a disconnecting client does not cancel it for the others
+        return await asyncio.shield(task)
@@ -1,35 +1,112 @@
 import time
-import schedule
-from etl.coingecko_etl import run_etl
-from config import CRYPTOCURRENCIES_TO_FETCH
-
-def scheduled_etl():
-    """Run the ETL process once and log the start and end times."""
-    print(f"Starting scheduled ETL process at {time.strftime('%Y-%m-%d %H:%M:%S')}...")
-    run_etl(CRYPTOCURRENCIES_TO_FETCH)
+from datetime import datetime
+from functools import partial
+from multiprocessing import Process
+from etl.coingecko_etl import run_etl, LoadPublisher
+from etl.scheduler import EtlScheduler, parse_tiers
+from etl.universe import CoinUniverse
+from config import ETL_METRICS_PORT, COINGECKO_RATE_LIMIT, COINGECKO_RATE_BURST
+from metrics import start_http_server
+
+def scheduled_etl(crypto_ids, publisher=None):
+    """Run the ETL process once for the coins that are due and log the start and end times."""
+    print(f"Starting scheduled ETL process for {len(crypto_ids)} cryptocurrencies at {time.strftime('%Y-%m-%d %H:%M:%S')}...")
+    if publisher is None:
+        run_etl(crypto_ids)
+    else:
+        # The load is published by the scheduler, together with the other runs of the same publish interval
+        history_rows = run_etl(crypto_ids, publish=False)
+        if history_rows is not None:
+            publisher.add(history_rows)
     print(f"Scheduled ETL process completed at {time.strftime('%Y-%m-%d %H:%M:%S')}")
 
 def run_continuous_update():
-    """Configure the process to run continuously at defined intervals."""
+    """Refresh each tier of coins at its own cadence (see ETL_TIERS), without overlapping runs."""
     print("Starting continuous update process...")
+    # The tiers are re-read before each run, so coins entering or leaving the top N are picked up
+    universe = CoinUniverse()
+    publisher = LoadPublisher()
+    scheduler = EtlScheduler(
+        partial(scheduled_etl, publisher=publisher), tiers=lambda: parse_tiers(crypto_ids=universe.get()), publisher=publisher
+    )
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+    print(f"Schedule stats: {scheduler.stats()}")
+
+def run_shard_worker(rate_limit=COINGECKO_RATE_LIMIT, metrics_port=None):
+    """Run one sharded ETL worker that refreshes the coins of the shards it holds a lease on."""
+    from etl.http_client import CoinGeckoClient, RateLimiter
+    from etl.sharding import ShardWorker
 
-    # Schedule the ETL process to run every 60 seconds
-    schedule.every(60).seconds.do(scheduled_etl)
+    if metrics_port:
+        start_http_server(metrics_port)
+    # Workers spawned by --workers share the CoinGecko quota of this node
+    CoinGeckoClient._rate_limiter = RateLimiter(rate_limit, COINGECKO_RATE_BURST)
+    worker = ShardWorker()
+    print(f"Starting sharded ETL worker {worker.worker_id}...")
+    try:
+        worker.run_forever(run_etl)
+    except KeyboardInterrupt:
+        worker.stop()
 
-    # Keep the process running indefinitely, checking every second
-    while True:
-        schedule.run_pending()  # Check for any scheduled tasks
-        time.sleep(1)  # Wait 1 second before checking again
+def run_shard_workers(n_workers):
+    """Run N sharded ETL workers as separate processes, splitting the rate limit between them."""
+    processes = [
+        # Each worker process serves its own metrics on the next ports after ETL_METRICS_PORT
+        Process(
+            target=run_shard_worker,
+            args=(COINGECKO_RATE_LIMIT / n_workers, ETL_METRICS_PORT + index + 1 if ETL_METRICS_PORT else None),
+            daemon=True
+        )
+        for index in range(n_workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+def run_backfill_command(args):
+    """Backfill history: --backfill START [END] [--coins id,id] (dates as YYYY-MM-DD; END defaults to today)."""
+    from etl.backfill import run_backfill
+
+    coins = None
+    if "--coins" in args:
+        index = args.index("--coins")
+        coins = [coin.strip() for coin in args[index + 1].split(",") if coin.strip()]
+        args = args[:index] + args[index + 2:]
+    start = datetime.fromisoformat(args[0])
+    end = datetime.fromisoformat(args[1]) if len(args) > 1 else None
+    run_backfill(coins or CoinUniverse().get(), start, end)
 
 if __name__ == "__main__":
     import sys  # Import sys only when running this script directly
 
+    # Expose the ETL metrics for Prometheus to scrape while this process runs
+    if ETL_METRICS_PORT:
+        start_http_server(ETL_METRICS_PORT)
+        print(f"Serving ETL metrics on port {ETL_METRICS_PORT} at /metrics")
+
     # Check if the "--continuous" argument is passed in the command line
     if len(sys.argv) > 1 and sys.argv[1] == "--continuous":
         # If the argument is present, run the continuous update process
         run_continuous_update()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        # Run one sharded worker; start one per node (or more) to split the coin universe
+        run_shard_worker()
+    elif len(sys.argv) > 2 and sys.argv[1] == "--workers":
+        # Run several sharded workers on this node
+        run_shard_workers(int(sys.argv[2]))
+    elif len(sys.argv) > 2 and sys.argv[1] == "--backfill":
+        # Load a long date range in chunks; re-running the same command resumes an interrupted backfill
+        run_backfill_command(sys.argv[2:])
     else:
         # If no argument is specified, run the ETL process only once
         print("Starting one-time ETL process for cryptocurrency data...")
-        run_etl(CRYPTOCURRENCIES_TO_FETCH)
+        run_etl(CoinUniverse().get())
         print("One-time ETL process completed.")
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config import CANDLE_CACHE_MAX_ENTRIES
+
+# Candle intervals and their width in seconds
+INTERVALS = {"1h": 3600, "4h": 4 * 3600, "1d": 86400, "1w": 7 * 86400}
+
+# 1970-01-01 was a Thursday: shift weekly buckets so they start on Monday
+WEEK_OFFSET = 4 * 86400
+
+# Columns of a candle series: bucket start (epoch seconds), prices, volume and number of samples per bucket
+CANDLE_FIELDS = ("time", "open", "high", "low", "close", "volume", "samples")
+
+# Start of the bucket containing each timestamp
+def bucket_start(timestamps, interval: str):
+    width = INTERVALS[interval]
+    offset = WEEK_OFFSET if interval == "1w" else 0
+    return (timestamps - offset) // width * width + offset
+
+def empty_candles():
+    return (
+        np.empty(0, dtype=np.int64), *(np.empty(0, dtype=np.float64) for _ in range(5)), np.empty(0, dtype=np.int64)
+    )
+
+# Reduce samples sorted by timestamp to one candle per non-empty bucket, in a single vectorized pass
+def build_candles(timestamps, close, volume, interval: str):
+    if not len(timestamps):
+        return empty_candles()
+    close = np.asarray(close, dtype=np.float64)
+    buckets = bucket_start(np.asarray(timestamps, dtype=np.int64), interval)
+
+    # Samples are sorted, so every bucket is a contiguous run starting where the bucket changes
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(buckets))
+    return (
+        buckets[starts],
+        close[starts],
+        np.maximum.reduceat(close, starts),
+        np.minimum.reduceat(close, starts),
+        close[ends - 1],
+        np.add.reduceat(np.asarray(volume, dtype=np.float64), starts),
+        ends - starts,
+    )
+
+def concat_candles(first, second):
+    return tuple(np.concatenate((a, b)) for a, b in zip(first, second))
+
+# Close price and volume of the last of the first `n` samples (None if there are none)
+def closing_sample(series, n: int):
+    return (float(series.close[n - 1]), float(series.volume[n - 1])) if n else None
+
+class CandleCache:
+    """
+    Closed candles per (coin, interval). Stored rows are dated at the start of their UTC day and only the
+    current day's row still changes, so a bucket that ends before today is final and never rebuilt; later
+    requests only reduce the samples after it. Backfilled rows change the sample count, which drops the entry.
+    The ETL keeps rewriting yesterday's row until its first cycle after midnight, so an entry also records the
+    last sample it was built from and is dropped if that sample has changed since.
+    """
+
+    def __init__(self, max_entries: int = CANDLE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (crypto_id, interval) -> (closed_before, n_samples, first_timestamp, last_sample, candles)
+        self.lock = threading.Lock()
+
+    def get_candles(self, series, interval: str, now: float = None):
+        """Returns the candle columns of a price series, reusing the cached closed buckets."""
+        timestamps = series.timestamps
+        if not len(timestamps):
+            return empty_candles()
+
+        # Buckets starting before the one that holds today's row are closed
+        today = int(now if now is not None else time.time()) // 86400 * 86400
+        closed_before = int(bucket_start(np.int64(today), interval))
+        n_closed = int(np.searchsorted(timestamps, closed_before, side="left"))
+        key = (series.crypto_id, interval)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        closed = None
+        if entry is not None:
+            cached_before, cached_n, first_timestamp, last_sample, cached = entry
+            # Still valid if the samples it was built from are unchanged in number, start and last value
+            if (
+                cached_before <= closed_before and int(timestamps[0]) == first_timestamp
+                and int(np.searchsorted(timestamps, cached_before, side="left")) == cached_n
+                and closing_sample(series, cached_n) == last_sample
+            ):
+                closed = cached
+                if cached_n < n_closed:
+                    # Buckets that closed since then only hold samples after the cached ones
+                    closed = concat_candles(cached, build_candles(
+                        timestamps[cached_n:n_closed], series.close[cached_n:n_closed], series.volume[cached_n:n_closed], interval
+                    ))
+                if cached_before != closed_before:
+                    entry = None
+
+        if closed is None:
+            closed = build_candles(timestamps[:n_closed], series.close[:n_closed], series.volume[:n_closed], interval)
+        if entry is None:
+            with self.lock:
+                self.entries[key] = (closed_before, n_closed, int(timestamps[0]), closing_sample(series, n_closed), closed)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+        # The open bucket(s) are rebuilt on every request
+        return concat_candles(closed, build_candles(
+            timestamps[n_closed:], series.close[n_closed:], series.volume[n_closed:], interval
+        ))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+_candle_cache = CandleCache()
+
+# Function to get the shared candle cache
+def get_candle_cache():
+    return _candle_cache
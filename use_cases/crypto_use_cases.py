@@ -1,38 +1,101 @@
-from repositories.crypto_repository import CryptoRepository
+from repositories.factory import get_repository, get_async_repository
+from repositories.price_store import get_price_store, to_timestamp
+from use_cases.candles import CANDLE_FIELDS, get_candle_cache
+from use_cases.indicators import compute_indicators, warmup_days
 from datetime import datetime, timedelta
 import numpy as np
 
 class GetAllCryptocurrenciesUseCase:
     @staticmethod
     def execute():
-        """Fetches all cryptocurrencies."""
-        repo = CryptoRepository()
+        """Fetches all cryptocurrencies, from the price snapshot when it holds the current generation."""
+        cryptocurrencies = get_price_store().get_cryptocurrencies()
+        if cryptocurrencies is not None:
+            return cryptocurrencies
+        repo = get_repository()
         return repo.get_all_cryptocurrencies()
 
+    @staticmethod
+    async def execute_async():
+        """Fetches all cryptocurrencies without blocking the event loop, from the price snapshot when it is current."""
+        cryptocurrencies = get_price_store().get_cryptocurrencies()
+        if cryptocurrencies is not None:
+            return cryptocurrencies
+        repo = get_async_repository()
+        return await repo.get_all_cryptocurrencies()
+
 class GetCryptocurrencyBySymbolUseCase:
     @staticmethod
     def execute(symbol: str):
         """Fetches a cryptocurrency by its symbol."""
-        repo = CryptoRepository()
+        repo = get_repository()
         return repo.get_cryptocurrency_by_symbol(symbol)
 
+    @staticmethod
+    async def execute_async(symbol: str):
+        """Fetches a cryptocurrency by its symbol without blocking the event loop."""
+        repo = get_async_repository()
+        return await repo.get_cryptocurrency_by_symbol(symbol)
+
 class GetHistoricalPricesByCryptoIdUseCase:
     @staticmethod
-    def execute(crypto_id: int, start_date: datetime = None, end_date: datetime = None):
+    def execute(crypto_id: int, start_date: datetime = None, end_date: datetime = None, limit: int = None, before: datetime = None):
         """Fetches historical prices for a given cryptocurrency ID and date range."""
-        repo = CryptoRepository()
-        return repo.get_historical_prices_by_crypto_id(crypto_id=crypto_id, start_date=start_date, end_date=end_date)
+        repo = get_repository()
+        return repo.get_historical_prices_by_crypto_id(
+            crypto_id=crypto_id, start_date=start_date, end_date=end_date, limit=limit, before=before
+        )
+
+    @staticmethod
+    async def execute_async(crypto_id: int, start_date: datetime = None, end_date: datetime = None, limit: int = None, before: datetime = None):
+        """Fetches historical prices for a given cryptocurrency ID and date range without blocking the event loop."""
+        repo = get_async_repository()
+        return await repo.get_historical_prices_by_crypto_id(
+            crypto_id=crypto_id, start_date=start_date, end_date=end_date, limit=limit, before=before
+        )
+
+    @staticmethod
+    def stream_async(crypto_id: int, start_date: datetime = None, end_date: datetime = None):
+        """Returns an async iterator over pages of historical prices, newest first."""
+        repo = get_async_repository()
+        return repo.iter_historical_prices(crypto_id=crypto_id, start_date=start_date, end_date=end_date)
+
+class GetCandlesUseCase:
+    @staticmethod
+    def execute(crypto_id: int, interval: str = "1d", start_date: datetime = None, end_date: datetime = None):
+        """Builds OHLC candles of a cryptocurrency from its stored samples; buckets without samples are left out."""
+        series = get_price_store().get(crypto_id)
+        if series is None or not len(series):
+            raise ValueError(f"No historical prices found for the cryptocurrency with ID {crypto_id}.")
+
+        candles = get_candle_cache().get_candles(series, interval)
+
+        # Keep the buckets that start within the requested range
+        times = candles[0]
+        lo = np.searchsorted(times, to_timestamp(start_date), side="left") if start_date else 0
+        hi = np.searchsorted(times, to_timestamp(end_date), side="right") if end_date else len(times)
+        columns = [column[lo:hi] for column in candles]
+        columns[0] = columns[0].astype("datetime64[s]").astype(str)
+
+        return {
+            "crypto_id": crypto_id,
+            "interval": interval,
+            "candles": [dict(zip(CANDLE_FIELDS, row)) for row in zip(*(column.tolist() for column in columns))],
+        }
 
 class CalculateCryptoROIUseCase:
     @staticmethod
     def execute(crypto_id: int, start_date: datetime, end_date: datetime):
         """Calculates the ROI for a cryptocurrency between two dates."""
-        repo = CryptoRepository()
-        initial_price = repo.get_price_on_date(crypto_id, start_date)
+        repo = get_repository()
+
+        # Resolve both prices (latest at or before each date) in a single query
+        prices = repo.get_prices_as_of([(crypto_id, start_date), (crypto_id, end_date)])
+        initial_price = prices[(crypto_id, start_date)]
         if initial_price is None:
             raise ValueError(f"No price found for the start date: {start_date}")
 
-        final_price = repo.get_price_on_date(crypto_id, end_date)
+        final_price = prices[(crypto_id, end_date)]
         if final_price is None:
             raise ValueError(f"No price found for the end date: {end_date}")
 
@@ -49,111 +112,224 @@ class GetHighestVolumeCryptoUseCase:
     @staticmethod
     def execute():
         """Fetches the cryptocurrency with the highest volume in the last 24 hours."""
-        repo = CryptoRepository()
+        repo = get_repository()
         return repo.get_highest_volume_crypto()
 
+    @staticmethod
+    async def execute_async():
+        """Fetches the cryptocurrency with the highest volume in the last 24 hours without blocking the event loop."""
+        repo = get_async_repository()
+        return await repo.get_highest_volume_crypto()
+
 class CalculateCorrelationUseCase:
     @staticmethod
     def execute(crypto_id_1: int, crypto_id_2: int, days: int = 7):
         """Calculates the correlation between two cryptocurrencies over a specified period."""
-        repo = CryptoRepository()
-
         # Define the date range
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
 
         # Fetch historical prices for both cryptocurrencies
-        crypto1_prices_data = repo.get_historical_prices_by_crypto_id(crypto_id_1, start_date=start_date, end_date=end_date)
-        crypto2_prices_data = repo.get_historical_prices_by_crypto_id(crypto_id_2, start_date=start_date, end_date=end_date)
-
-        if not crypto1_prices_data or not crypto2_prices_data:
+        series = get_price_store().get_series([crypto_id_1, crypto_id_2])
+        if crypto_id_1 not in series or crypto_id_2 not in series:
             raise ValueError("Insufficient data to calculate correlation")
+        crypto1 = series[crypto_id_1].window(start_date, end_date)
+        crypto2 = series[crypto_id_2].window(start_date, end_date)
+
+        # Align prices by common timestamps; both arrays are already sorted
+        _, index1, index2 = np.intersect1d(crypto1.timestamps, crypto2.timestamps, assume_unique=True, return_indices=True)
+        if len(index1) < 2:
+            raise ValueError("Not enough common dates to calculate correlation")
+
+        # Calculate correlation between the two price lists
+        correlation = np.corrcoef(crypto1.close[index1], crypto2.close[index2])[0, 1]
+        return {"correlation": float(correlation), "days": days, "crypto_id_1": crypto_id_1, "crypto_id_2": crypto_id_2}
 
-        # Map dates to prices
-        crypto1_prices = {entry.date: entry.close_price for entry in crypto1_prices_data}
-        crypto2_prices = {entry.date: entry.close_price for entry in crypto2_prices_data}
+class CalculateCorrelationMatrixUseCase:
+    @staticmethod
+    def execute(days: int = 30, min_overlap: int = 2):
+        """Calculates the correlation matrix of daily log returns for all tracked cryptocurrencies."""
+        all_cryptocurrencies = GetAllCryptocurrenciesUseCase.execute()
+        if not all_cryptocurrencies:
+            raise ValueError("No tracked cryptocurrencies found.")
 
-        # Find common dates for alignment
-        common_dates = set(crypto1_prices.keys()) & set(crypto2_prices.keys())
-        if len(common_dates) < 2:
+        # Load the history of every tracked cryptocurrency in a single bulk query
+        series = get_price_store().get_series([crypto.id for crypto in all_cryptocurrencies])
+        start_date = datetime.now() - timedelta(days=days) if days else None
+        windows = {crypto_id: s.window(start_date) for crypto_id, s in series.items()}
+        windows = {crypto_id: w for crypto_id, w in windows.items() if len(w) > 0}
+        if len(windows) < 2:
+            raise ValueError("Insufficient data to calculate correlation")
+
+        # Align every coin on a shared date index; missing samples stay NaN
+        crypto_ids = list(windows)
+        timestamps = np.unique(np.concatenate([w.timestamps for w in windows.values()]))
+        prices = np.full((len(crypto_ids), len(timestamps)), np.nan)
+        for row, w in enumerate(windows.values()):
+            prices[row, np.searchsorted(timestamps, w.timestamps)] = w.close
+
+        # Log returns between consecutive dates; a return is only valid when both prices exist
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.diff(np.log(prices), axis=1)
+        valid = np.isfinite(returns)
+
+        # Drop coins with too little data, then keep the dates where all remaining coins have a return
+        keep = valid.sum(axis=1) >= min_overlap
+        returns, valid = returns[keep], valid[keep]
+        crypto_ids = [crypto_id for crypto_id, kept in zip(crypto_ids, keep) if kept]
+        common = valid.all(axis=0)
+        if len(crypto_ids) < 2 or common.sum() < min_overlap:
             raise ValueError("Not enough common dates to calculate correlation")
 
-        # Align prices by common dates
-        aligned_crypto1_prices = [crypto1_prices[date] for date in sorted(common_dates)]
-        aligned_crypto2_prices = [crypto2_prices[date] for date in sorted(common_dates)]
+        # Compute the whole N x N matrix at once
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = np.corrcoef(returns[:, common])
 
-        # Calculate correlation between the two price lists
-        correlation = np.corrcoef(aligned_crypto1_prices, aligned_crypto2_prices)[0, 1]
-        return {"correlation": correlation, "days": days, "crypto_id_1": crypto_id_1, "crypto_id_2": crypto_id_2}
+        # Constant series (e.g. stablecoins) have no defined correlation; report them as null
+        coingecko_ids = {crypto.id: crypto.coingecko_id for crypto in all_cryptocurrencies}
+        return {
+            "crypto_ids": crypto_ids,
+            "coingecko_ids": [coingecko_ids[crypto_id] for crypto_id in crypto_ids],
+            "matrix": [[None if np.isnan(value) else float(value) for value in row] for row in matrix],
+            "observations": int(common.sum()),
+            "days": days
+        }
 
 class CalculateVolatilityUseCase:
     @staticmethod
-    def execute():
-        """Calculates the volatility of all tracked cryptocurrencies."""
-        repo = CryptoRepository()
-        all_cryptocurrencies = repo.get_all_cryptocurrencies()
+    def execute(windows: list[int] = (7, 30, 90), annualize: bool = True):
+        """Calculates the volatility of daily log returns of all tracked cryptocurrencies over rolling windows."""
+        all_cryptocurrencies = GetAllCryptocurrenciesUseCase.execute()
 
         if not all_cryptocurrencies:
             raise ValueError("No tracked cryptocurrencies found.")
 
-        volatility_results = []
-        for crypto in all_cryptocurrencies:
-            historical_prices_data = repo.get_historical_prices_by_crypto_id(crypto.id)
-            if not historical_prices_data:
-                continue
-
-            # Calculate the standard deviation of closing prices as a measure of volatility
-            close_prices = [entry.close_price for entry in historical_prices_data]
-            if len(close_prices) > 1:
-                volatility = np.std(close_prices)
-                volatility_results.append({
-                    "crypto_id": crypto.id,
-                    "coingecko_id": crypto.coingecko_id,
-                    "volatility": volatility
-                })
-
-        return volatility_results
+        # Fetch only the rows needed by the longest window, for every coin at once (snapshot or single query)
+        now = datetime.now()
+        start_date = now - timedelta(days=max(windows) + 1)
+        columns = get_price_store().get_columns([crypto.id for crypto in all_cryptocurrencies], start_date=start_date)
+        if columns is None:
+            return []
+        ids, timestamps, close, _, _ = columns
+
+        # Daily log returns; drop the differences that cross from one coin to the next
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.diff(np.log(close))
+        same_coin = (ids[1:] == ids[:-1]) & np.isfinite(returns)
+        returns, return_ids, return_timestamps = returns[same_coin], ids[1:][same_coin], timestamps[1:][same_coin]
+        crypto_ids, groups = np.unique(return_ids, return_inverse=True)
+
+        # Grouped sample standard deviation per window, using bincount sums instead of per-coin loops
+        scale = np.sqrt(365) if annualize else 1.0
+        volatility_by_window = {}
+        for window in windows:
+            in_window = return_timestamps >= to_timestamp(now - timedelta(days=window))
+            group, value = groups[in_window], returns[in_window]
+            count = np.bincount(group, minlength=len(crypto_ids))
+            total = np.bincount(group, weights=value, minlength=len(crypto_ids))
+            total_sq = np.bincount(group, weights=value * value, minlength=len(crypto_ids))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                variance = (total_sq - total * total / count) / (count - 1)
+            volatility = np.sqrt(np.clip(variance, 0, None)) * scale
+            volatility_by_window[f"{window}d"] = np.where(count > 1, volatility, np.nan)
+
+        coingecko_ids = {crypto.id: crypto.coingecko_id for crypto in all_cryptocurrencies}
+        return [
+            {
+                "crypto_id": int(crypto_id),
+                "coingecko_id": coingecko_ids.get(int(crypto_id)),
+                "volatility": {
+                    label: None if np.isnan(values[index]) else float(values[index])
+                    for label, values in volatility_by_window.items()
+                },
+                "annualized": annualize
+            }
+            for index, crypto_id in enumerate(crypto_ids)
+        ]
+
+class CalculateIndicatorsUseCase:
+    @staticmethod
+    def execute(specs, crypto_ids: list[int] = None, days: int = 365, history: bool = False):
+        """Calculates technical indicators of many cryptocurrencies at once over the last `days` days."""
+        all_cryptocurrencies = GetAllCryptocurrenciesUseCase.execute()
+        if not all_cryptocurrencies:
+            raise ValueError("No tracked cryptocurrencies found.")
+        coingecko_ids = {crypto.id: crypto.coingecko_id for crypto in all_cryptocurrencies}
+
+        # Load the requested period plus the warm-up of the longest window, for every coin at once
+        now = datetime.now()
+        start_date = now - timedelta(days=days)
+        columns = get_price_store().get_columns(
+            crypto_ids or list(coingecko_ids), start_date=start_date - timedelta(days=warmup_days(specs))
+        )
+        if columns is None:
+            raise ValueError("No historical prices found for the requested cryptocurrencies.")
+        ids, timestamps, close, _, _ = columns
+
+        # Align every coin on a shared date index in one scatter; missing samples stay NaN
+        dates = np.unique(timestamps)
+        found_ids, rows = np.unique(ids, return_inverse=True)
+        prices = np.full((len(found_ids), len(dates)), np.nan)
+        prices[rows, np.searchsorted(dates, timestamps)] = close
+
+        output_start = int(np.searchsorted(dates, to_timestamp(start_date)))
+        results = compute_indicators(prices, specs, output_start)
+
+        def as_number(value):
+            return None if np.isnan(value) else float(value)
+
+        # Series indicators report their latest value, and the whole period with `history`
+        coins = []
+        for row, crypto_id in enumerate(found_ids):
+            entry = {
+                "crypto_id": int(crypto_id),
+                "coingecko_id": coingecko_ids.get(int(crypto_id)),
+                "indicators": {
+                    label: as_number(values[row, -1] if values.ndim == 2 else values[row]) if values.shape[-1] else None
+                    for label, values in results.items()
+                },
+            }
+            if history:
+                entry["series"] = {
+                    label: [as_number(value) for value in values[row]]
+                    for label, values in results.items() if values.ndim == 2
+                }
+            coins.append(entry)
+
+        result = {"days": days, "indicators": list(results), "cryptocurrencies": coins}
+        if history:
+            result["dates"] = dates[output_start:].astype("datetime64[s]").astype("datetime64[D]").astype(str).tolist()
+        return result
 
 class CalculateMarketDominanceUseCase:
     @staticmethod
     def execute():
         """Calculates the market dominance for all tracked cryptocurrencies."""
-        repo = CryptoRepository()
-        all_cryptocurrencies = repo.get_all_cryptocurrencies()
+        repo = get_repository()
 
-        if not all_cryptocurrencies:
+        # Each cryptocurrency's market cap as a percentage of the total market cap
+        dominance_results = repo.get_market_dominance()
+        if not dominance_results:
             raise ValueError("No cryptocurrencies found in the database.")
 
-        # Calculate total market cap across all tracked cryptocurrencies
-        total_market_cap = sum(crypto.market_cap for crypto in all_cryptocurrencies if crypto.market_cap)
-
-        dominance_results = []
-        for crypto in all_cryptocurrencies:
-            if crypto.market_cap and total_market_cap > 0:
-                # Calculate the market dominance as a percentage of the total market cap
-                dominance = (crypto.market_cap / total_market_cap) * 100
-                dominance_results.append({
-                    "crypto_id": crypto.id,
-                    "coingecko_id": crypto.coingecko_id,
-                    "dominance": dominance
-                })
-
         return dominance_results
 
 class AnalyzePriceTrendUseCase:
     @staticmethod
     def execute(crypto_id: int, period: int):
         """Analyzes the price trend of a cryptocurrency over a specified period."""
-        repo = CryptoRepository()
-        historical_prices = repo.get_historical_prices_by_crypto_id(crypto_id)
-        if not historical_prices:
+        repo = get_repository()
+
+        # Resolve the current price and the price at the start of the period in a single query
+        now = datetime.now()
+        start_date = now - timedelta(days=period)
+        prices = repo.get_prices_as_of([(crypto_id, now), (crypto_id, start_date)])
+
+        current_price = prices[(crypto_id, now)]
+        if current_price is None:
             raise ValueError(f"No historical prices found for the cryptocurrency with ID {crypto_id}.")
 
-        # Get the current price
-        current_price = historical_prices[-1].close_price
-        start_date = datetime.now() - timedelta(days=period)
-        price_then = repo.get_price_on_date(crypto_id, start_date)
-        
+        price_then = prices[(crypto_id, start_date)]
         if price_then is None:
             raise ValueError(f"No price found for {period} days ago.")
 
@@ -173,23 +349,25 @@ class ComparePerformanceUseCase:
     @staticmethod
     def execute(crypto_ids: list[int], period: int):
         """Compares the performance of multiple cryptocurrencies over a specified period."""
-        repo = CryptoRepository()
+        repo = get_repository()
         performance = []
 
         if period < 1:
             raise ValueError("The period must be a positive integer greater than or equal to 1.")
 
-        for crypto_id in crypto_ids:
-            historical_prices = repo.get_historical_prices_by_crypto_id(crypto_id)
-            if not historical_prices:
-                continue
+        # Resolve the current and past price of every cryptocurrency in a single query
+        now = datetime.now()
+        start_date = now - timedelta(days=period)
+        prices = repo.get_prices_as_of(
+            [(crypto_id, now) for crypto_id in crypto_ids] + [(crypto_id, start_date) for crypto_id in crypto_ids]
+        )
 
+        for crypto_id in crypto_ids:
             # Get the current price and price from the specified period ago
-            current_price = historical_prices[-1].close_price
-            start_date = datetime.now() - timedelta(days=period)
-            price_then = repo.get_price_on_date(crypto_id, start_date)
-            
-            if price_then is None:
+            current_price = prices[(crypto_id, now)]
+            price_then = prices[(crypto_id, start_date)]
+
+            if current_price is None or price_then is None:
                 continue
 
             # Calculate percentage change over the period
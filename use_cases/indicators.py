@@ -0,0 +1,152 @@
+import numpy as np
+
+# Supported indicators and their default window in days (None: computed over the whole requested period)
+INDICATORS = {
+    "sma": 20,            # Simple moving average of the close price
+    "ema": 20,            # Exponential moving average of the close price (span)
+    "rsi": 14,            # Relative strength index with Wilder's smoothing
+    "volatility": 30,     # Rolling annualized standard deviation of daily log returns
+    "max_drawdown": None, # Largest peak-to-trough decline, as a fraction of the peak
+    "sharpe": None,       # Annualized mean over standard deviation of daily log returns (zero risk-free rate)
+}
+SERIES_INDICATORS = ("sma", "ema", "rsi", "volatility")
+MAX_WINDOW = 3650
+
+# Parse names such as "sma:50" or "rsi" into unique (indicator, window) pairs
+def parse_indicators(names):
+    specs = []
+    for name in names:
+        kind, _, param = name.strip().lower().partition(":")
+        if kind not in INDICATORS:
+            raise ValueError(f"Unknown indicator '{name}', expected one of: {', '.join(INDICATORS)}")
+        if INDICATORS[kind] is None:
+            if param:
+                raise ValueError(f"Indicator '{kind}' does not take a window")
+            specs.append((kind, None))
+            continue
+        try:
+            window = int(param) if param else INDICATORS[kind]
+        except ValueError:
+            raise ValueError(f"Invalid window in indicator '{name}'")
+        if not 2 <= window <= MAX_WINDOW:
+            raise ValueError(f"The window of indicator '{name}' must be between 2 and {MAX_WINDOW} days")
+        specs.append((kind, window))
+    return list(dict.fromkeys(specs))
+
+def indicator_label(kind: str, window: int = None) -> str:
+    return f"{kind}:{window}" if window else kind
+
+# Days of history needed before the first output date for the indicators to be fully formed
+def warmup_days(specs):
+    # Exponential averages never fully forget their seed; after 4 windows its weight is below 2%
+    return max([window * (4 if kind in ("ema", "rsi") else 1) + 1 for kind, window in specs if window] or [1])
+
+# Carry the last price forward over missing days; days before a coin's first price stay NaN
+def forward_fill(values):
+    index = np.where(np.isfinite(values), np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    return values[np.arange(values.shape[0])[:, None], index]
+
+# Sum of each trailing window along the time axis from cumulative sums: O(days) whatever the window size
+def rolling_sum(values, window: int):
+    valid = np.isfinite(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    pad = np.zeros((values.shape[0], 1))
+    sums, counts = np.hstack([pad, sums]), np.hstack([pad, counts])
+
+    result = np.full(values.shape, np.nan)
+    window_sums = sums[:, window:] - sums[:, :-window]
+    complete = (counts[:, window:] - counts[:, :-window]) == window
+    result[:, window - 1:] = np.where(complete, window_sums, np.nan)
+    return result
+
+def sma(prices, window: int):
+    return rolling_sum(prices, window) / window
+
+# Exponential average of every row at once; the recursion steps through time, each step vectorized over coins.
+# Rows may start with NaN (before a coin was listed) but must have no gaps afterwards, as after forward_fill
+def exponential_average(values, alpha: float):
+    started = np.logical_or.accumulate(np.isfinite(values), axis=1)
+    first = started.argmax(axis=1)
+
+    # Hold each row at its first value until it starts, so the recursion needs no NaN checks.
+    # Time-major copies keep every step on contiguous memory
+    seeded = np.ascontiguousarray(np.where(started, values, values[np.arange(values.shape[0]), first][:, None]).T)
+    result = np.empty(seeded.shape)
+    current = seeded[0].copy()
+    for t in range(seeded.shape[0]):
+        current += alpha * (seeded[t] - current)
+        result[t] = current
+    result = result.T
+    result[~started] = np.nan
+    return result
+
+def ema(prices, span: int):
+    return exponential_average(prices, 2.0 / (span + 1))
+
+def rsi(prices, period: int):
+    deltas = np.diff(prices, axis=1)
+    gains = exponential_average(np.where(np.isnan(deltas), np.nan, np.clip(deltas, 0, None)), 1.0 / period)
+    losses = exponential_average(np.where(np.isnan(deltas), np.nan, np.clip(-deltas, 0, None)), 1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(losses == 0, np.where(gains > 0, 100.0, 50.0), 100.0 - 100.0 / (1.0 + gains / losses))
+    values = np.where(np.isnan(gains) | np.isnan(losses), np.nan, values)
+    return np.hstack([np.full((prices.shape[0], 1), np.nan), values])
+
+def log_returns(prices):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(prices), axis=1)
+    returns[~np.isfinite(returns)] = np.nan
+    return np.hstack([np.full((prices.shape[0], 1), np.nan), returns])
+
+# Rolling sample standard deviation of daily log returns from sums of values and squares
+def rolling_volatility(prices, window: int, annualize: bool = True):
+    returns = log_returns(prices)
+    total, total_sq = rolling_sum(returns, window), rolling_sum(returns * returns, window)
+    variance = (total_sq - total * total / window) / (window - 1)
+    return np.sqrt(np.clip(variance, 0, None)) * (np.sqrt(365) if annualize else 1.0)
+
+def max_drawdown(prices):
+    # Running peak ignoring missing days (fmax skips NaN)
+    peaks = np.fmax.accumulate(prices, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = prices / peaks - 1.0
+    has_data = np.isfinite(drawdowns).any(axis=1)
+    return np.where(has_data, np.min(np.where(np.isfinite(drawdowns), drawdowns, 0.0), axis=1), np.nan)
+
+def sharpe_ratio(prices, annualize: bool = True):
+    returns = log_returns(prices)
+    valid = np.isfinite(returns)
+    count = valid.sum(axis=1)
+    values = np.where(valid, returns, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = values.sum(axis=1) / count
+        std = np.sqrt(np.where(valid, (values - mean[:, None]) ** 2, 0.0).sum(axis=1) / (count - 1))
+        ratio = mean / std * (np.sqrt(365) if annualize else 1.0)
+    return np.where((count > 1) & (std > 0), ratio, np.nan)
+
+def compute_indicators(prices, specs, output_start: int = 0):
+    """
+    Computes indicators for every row of a (coins x days) matrix of daily prices in one pass. Series indicators are
+    (coins x days) matrices trimmed to the columns from `output_start` on; the others are one value per coin,
+    computed over those columns only.
+    """
+    prices = forward_fill(prices)
+    period = prices[:, output_start:]
+    results = {}
+    for kind, window in specs:
+        if kind == "sma":
+            values = sma(prices, window)
+        elif kind == "ema":
+            values = ema(prices, window)
+        elif kind == "rsi":
+            values = rsi(prices, window)
+        elif kind == "volatility":
+            values = rolling_volatility(prices, window)
+        elif kind == "max_drawdown":
+            values = max_drawdown(period)
+        else:
+            values = sharpe_ratio(period)
+        results[indicator_label(kind, window)] = values[:, output_start:] if kind in SERIES_INDICATORS else values
+    return results